@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Les modules de data_base/ s'importent entre eux sans préfixe (comme quand on lance app.py) :
+# les tests font pareil, pour n'avoir qu'une copie de chaque module
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_base"))
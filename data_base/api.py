@@ -0,0 +1,154 @@
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import db_auth_utils  # avant db_tweet_utils (import circulaire)
+import db_tweet_utils
+from db_auth_utils import UserNotFoundError
+from db_tweet_utils import TweetNotFound
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Authentification (jeton) pour servir aussi le fil d'abonnements et les likes du lecteur
+    # Mettre la même API devant les écritures (post, like...) et retirer les routes JSON de app.py
+
+# API JSON en lecture seule, asynchrone, à côté de l'appli Flask (même couche de données) :
+#   uvicorn api:api --port 8000   (depuis data_base/, ou python api.py)
+# Les listes de tweets sont envoyées en NDJSON (un tweet JSON par ligne), page par
+# page : le client peut afficher les premiers tweets avant que la réponse soit finie.
+
+#------------ Variables globales ------------#
+API_PAGE_SIZE = 20  #nb de tweets par défaut d'une liste
+API_MAX_LIMIT = 1000  #nb max de tweets d'une liste (envoyés par morceaux de STREAM_CHUNK)
+STREAM_CHUNK = 100  #nb de tweets lus dans la DB (et envoyés) à la fois
+NDJSON = "application/x-ndjson"
+
+api = FastAPI(title="TweetInsa", description="Lecture des tweets (timeline, tweets, profils).")
+
+
+#------------ Modèles ------------#
+class Reply(BaseModel):
+    reply_id: str
+    username: str
+    date: str
+    content: str
+
+class Tweet(BaseModel):
+    tweet_id: str
+    username: str
+    date: str
+    content: str
+    media_path: Optional[str] = None
+    hashtags: List[str] = []
+    mentions: List[str] = []
+    likes_count: int
+    retweet_count: int
+    reply_count: int
+
+class TweetDetail(Tweet):
+    replies: List[Reply]  # première page des réponses
+    replies_cursor: Optional[str] = None  # suite : /tweet/<id>/replies?cursor= (appli Flask)
+
+
+#------------ Fonctions internes ------------#
+def _public(t, reply_count):
+    """Champs publics d'un tweet (copie résolue, voir db_tweet_utils.get_tweets)."""
+    return {
+        "tweet_id": t["tweet_id"],
+        "username": t["username"],
+        "date": db_tweet_utils._format_date(t.get("date", "")),
+        "content": t.get("content", ""),
+        "media_path": t.get("media_path"),
+        "hashtags": t.get("hashtags", []),
+        "mentions": t.get("mentions", []),
+        "likes_count": len(t.get("likes", ())),
+        "retweet_count": len(t.get("retweets", ())),
+        "reply_count": reply_count,
+    }
+
+def _lines(tweets):
+    """Tweets d'une page en lignes NDJSON (nb de réponses lus en une fois)."""
+    counts = db_tweet_utils._store().previews([t["tweet_id"] for t in tweets], 0)
+    return "".join(json.dumps(_public(t, counts[t["tweet_id"]][0]), ensure_ascii=False) + "\n"
+                   for t in tweets)
+
+def _timeline_page(before, limit):
+    """Page de la timeline globale, tweets résolus (avec "username")."""
+    page, next_cursor = db_tweet_utils.get_timeline_page(before, limit)
+    return db_tweet_utils.get_tweets(t["tweet_id"] for t in page), next_cursor
+
+async def _stream(fetch, cursor, limit, first=None):
+    """
+    Envoie jusqu'à limit tweets en NDJSON, STREAM_CHUNK à la fois. La couche
+    de données est synchrone (verrous, fichiers) : chaque lecture tourne dans
+    un thread, la boucle reste libre pour les autres clients pendant ce temps.
+    La dernière ligne est {"next_cursor": ...}, à repasser en ?before= pour
+    la suite (null si c'est la fin).
+
+    Parameters
+    ----------
+    fetch : function
+        (curseur, nb) -> (tweets résolus, curseur suivant).
+    cursor : str
+        Curseur de départ (None pour le début).
+    limit : int
+        Nombre maximum de tweets.
+    first : tuple, optional
+        Première page, déjà lue (pour répondre 404 avant d'envoyer quoi que ce soit).
+    """
+    sent = 0
+    while sent < limit:
+        if first is not None:
+            tweets, cursor = first
+            first = None
+        else:
+            tweets, cursor = await asyncio.to_thread(fetch, cursor, min(STREAM_CHUNK, limit - sent))
+        yield await asyncio.to_thread(_lines, tweets)
+        sent += len(tweets)
+        if cursor is None:
+            break
+    yield json.dumps({"next_cursor": cursor}) + "\n"
+
+
+#------------ Routes ------------#
+@api.get("/api/timeline")
+async def timeline(before: Optional[str] = None, limit: int = Query(API_PAGE_SIZE, ge=1, le=API_MAX_LIMIT)):
+    """Timeline globale, du plus récent au plus ancien (NDJSON)."""
+    return StreamingResponse(_stream(_timeline_page, before, limit), media_type=NDJSON)
+
+@api.get("/api/tweets/{tweet_id}", response_model=TweetDetail)
+async def tweet(tweet_id: str):
+    """Un tweet, avec la première page de ses réponses."""
+    def read():
+        found = db_tweet_utils.get_tweets([tweet_id])  # sans les réponses : elles sont paginées
+        if not found:
+            raise TweetNotFound(tweet_id)
+        replies, replies_cursor = db_tweet_utils.get_replies(tweet_id)
+        detail = _public(found[0], db_tweet_utils._store().previews([tweet_id], 0)[tweet_id][0])
+        detail["replies"] = [{"reply_id": r["reply_id"], "username": r["username"],
+                              "date": r.get("date", ""), "content": r.get("content", "")} for r in replies]
+        detail["replies_cursor"] = replies_cursor
+        return detail
+    try:
+        return await asyncio.to_thread(read)
+    except TweetNotFound:
+        raise HTTPException(status_code=404, detail="Tweet non trouvé")
+
+@api.get("/api/users/{username}/tweets")
+async def user_tweets(username: str, before: Optional[str] = None,
+                      limit: int = Query(API_PAGE_SIZE, ge=1, le=API_MAX_LIMIT)):
+    """Tweets d'un utilisateur, du plus récent au plus ancien (NDJSON)."""
+    fetch = lambda cursor, nb: db_auth_utils.get_user_tweets_page(username, cursor, nb)
+    try:
+        # Première page lue avant de répondre : un user inconnu donne une vraie 404
+        first = await asyncio.to_thread(fetch, before, min(STREAM_CHUNK, limit))
+    except UserNotFoundError:
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    return StreamingResponse(_stream(fetch, before, limit, first), media_type=NDJSON)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(api, port=8000)
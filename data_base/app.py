@@ -1,11 +1,16 @@
 import traceback
-from flask import Flask, send_from_directory, request, render_template, redirect, send_file, url_for, session, jsonify, flash, Response
-import base64
+from flask import Flask, send_from_directory, request, render_template, redirect, send_file, url_for, session, jsonify, flash, g
 import json
+import db_blob_utils
 from db_auth_utils import *
 from db_tweet_utils import *
-from db_tweet_utils import _load_tweets, _save_tweets, has_user_retweeted, get_retweet_count, toggle_retweet
+from db_tweet_utils import _load_tweets, _save_tweets
 from db_auth_utils import _load_db, _save_db, _hash_password
+import db_tweet_utils
+import media_utils
+import search_utils
+import trending_utils
+import moderation_utils
 from datetime import datetime
 import os
 import secrets
@@ -17,10 +22,72 @@ UPLOAD_FOLDER = os.path.join(app.root_path, '..', 'static', 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov'}  # Extensions autorisées
 
+TIMELINE_PAGE_SIZE = 20  # tweets par page de timeline
+TIMELINE_MAX_PAGE_SIZE = 100
+PROFILE_PAGE_SIZE = 20  # tweets par page de profil
+SEARCH_USER_LIMIT = 10  # suggestions renvoyées par /search_user
+SEARCH_USER_MAX_LIMIT = 50
+SEARCH_TWEETS_MAX_LIMIT = 50  # résultats max par page de /search_tweets
+REPLIES_MAX_LIMIT = 100  # réponses max par page de /tweet/<id>/replies
+REPORTS_BEFORE_DELETE = 3  # signalements avant suppression automatique d'un tweet
+MODERATION_MAX_LIMIT = 100  # tweets max renvoyés par /moderation
+# uid des modérateurs (pas les usernames, qui peuvent changer), ex : TWEETINSA_MODERATORS="3f2a...,9c41..."
+MODERATORS = {uid.strip() for uid in os.environ.get("TWEETINSA_MODERATORS", "").split(",") if uid.strip()}
+DISCOVER_SIZE = 5  # tweets tirés au sort dans l'encart "À découvrir"
+DISCOVER_MAX_AGE = 7 * 24 * 3600  # en secondes : on propose des tweets de la semaine
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+# ================================================
+# CACHE PAR REQUÊTE (flask.g)
+# ================================================
+# Un même user n'est cherché qu'une fois par requête, même s'il est demandé
+# par le context processor, la route et le template (pfp_url pour chaque
+# tweet...). g est vidé à la fin de chaque requête : rien ne reste périmé
+# d'une requête à l'autre. Les users renvoyés sont les objets du cache de
+# db_auth_utils, une modification faite pendant la requête est donc visible.
+def cached_user(username):
+    """get_user, mémorisé pour la requête (None si inconnu)."""
+    users = g.setdefault("users", {})
+    if username not in users:
+        users[username] = get_user(username)
+    return users[username]
+
+def cached_user_by_uid(uid):
+    """get_user_by_uid, mémorisé pour la requête (None si inconnu)."""
+    users = g.setdefault("users_by_uid", {})
+    if uid not in users:
+        users[uid] = get_user_by_uid(uid)
+    return users[uid]
+
+def forget_cached_user(username):
+    """À appeler quand un username change ou disparaît pendant la requête."""
+    g.setdefault("users", {}).pop(username, None)
+
+def cached_tweet(tweet_id):
+    """get_tweet, mémorisé pour la requête (lève TweetNotFound si inconnu)."""
+    tweets = g.setdefault("tweets", {})
+    if tweet_id not in tweets:
+        tweets[tweet_id] = get_tweet(tweet_id)
+    return tweets[tweet_id]
+
+def forget_cached_tweet(tweet_id):
+    """À appeler après avoir modifié ou supprimé le tweet pendant la requête."""
+    g.setdefault("tweets", {}).pop(tweet_id, None)
+
+def logged_user():
+    """Le user connecté (mémorisé pour la requête), None si personne."""
+    if 'username' not in session:
+        return None
+    return cached_user(session['username'])
+
+def is_moderator():
+    """Le user connecté est-il modérateur (reconnu par son uid) ?"""
+    user = logged_user()
+    return user is not None and user.get("uid") in MODERATORS
+
 # ================================================
 # CONTEXT PROCESSOR → session dispo partout !
 # ================================================
@@ -31,9 +98,7 @@ def inject_session():
 # Optionnel mais ultra pratique : current_user dispo partout aussi
 @app.context_processor
 def inject_user():
-    if 'username' in session:
-        return {'current_user': get_user(session['username'])}
-    return {'current_user': None}
+    return {'current_user': logged_user()}
 
 # ================================================
 # ROUTES
@@ -93,23 +158,30 @@ def timeline():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    db = _load_tweets()
-    tweets = db.get("tweets", [])
-    tweets = sorted(tweets, key=lambda t: t["date"], reverse=True)
+    # Une page à la fois, via l'index trié par date (pas de tri de tous les tweets)
+    before = request.args.get("before")
+    limit = request.args.get("limit", TIMELINE_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, TIMELINE_MAX_PAGE_SIZE))
 
-    for t in tweets:
+    # "tous" (par défaut) : tous les tweets / "abonnements" : tweets des comptes suivis
+    feed = request.args.get("feed", "tous")
+    if feed == "abonnements":
         try:
-            t["date"] = t["date"].replace("T", " ")[:16]
-        except:
-            pass
+            tweets, next_cursor = get_home_timeline(session['username'], before, limit)
+        except UserNotFoundError:
+            session.clear()
+            return redirect(url_for('login'))
+    else:
+        feed = "tous"
+        tweets, next_cursor = get_timeline_page(before, limit)
 
+    # likes / retweets du viewer calculés en une passe (pas d'appel par tweet dans le template)
     return render_template(
         "timeline.html",
-        tweets=tweets,
-        has_user_liked=has_user_liked,
-        get_likes_count=get_likes_count,
-        has_user_retweeted=has_user_retweeted,      
-        get_retweet_count=get_retweet_count          
+        tweets=timeline_view(tweets, session['username']),
+        next_cursor=next_cursor,
+        limit=limit,
+        feed=feed
 )
 
 @app.route('/static/<path:filename>')
@@ -140,7 +212,10 @@ def post_tweet_route():
 
     try:
         print("Chemin du média :", media_path)  # Debug
-        post_tweet(session['username'], content, media_path)
+        tweet = post_tweet(session['username'], content, media_path)
+        if media_path:
+            # Miniatures / version web / aperçu vidéo générés en arrière-plan
+            media_utils.submit_media(tweet["tweet_id"], media_path)
     except TweetTooLong:
         flash("Ton tweet est trop long ! (max 140 caractères)")
     except Exception as e:
@@ -155,23 +230,26 @@ def profile():
         return redirect(url_for('login'))
 
     username = session['username']
-    user = get_user(username)
-    tweets = get_user_tweets(username)
+    user = logged_user()
 
     if not user:
         return "Utilisateur non trouvé", 404
 
-    return render_template('profile.html', user=user, tweets=tweets)
+    # Une page à la fois : même un compte avec des milliers de tweets s'affiche vite
+    tweets, next_cursor = get_user_tweets_page(username, request.args.get("before"), PROFILE_PAGE_SIZE)
+    older_url = url_for('profile', before=next_cursor) if next_cursor else None
+    return render_template('profile.html', user=user, tweets=tweets, older_url=older_url)
 
 @app.route("/profile/<username>")
 def profile_by_name(username):    
-    user = get_user(username)
+    user = cached_user(username)
     if user:
-        return render_template("profile.html", user=user, tweets=get_user_tweets(username))
+        tweets, next_cursor = get_user_tweets_page(username, request.args.get("before"), PROFILE_PAGE_SIZE)
+        older_url = url_for('profile_by_name', username=username, before=next_cursor) if next_cursor else None
+        return render_template("profile.html", user=user, tweets=tweets, older_url=older_url)
 
-    # Suggestions si l'utilisateur n'existe pas
-    db = _load_db()
-    suggestions = [u["username"] for u in db.get("users", []) if username.lower() in u["username"].lower()]
+    # Suggestions si l'utilisateur n'existe pas (noms proches, fautes de frappe comprises)
+    suggestions = suggest_usernames(username)
     return render_template("user_not_found.html", query=username, suggestions=suggestions)
 
 
@@ -181,7 +259,7 @@ def edit_profile():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    current_user = get_user(session['username'])
+    current_user = logged_user()
     if not current_user:
         return redirect(url_for('login'))
 
@@ -220,49 +298,62 @@ def edit_profile():
                                form_username=new_username or current_user['username'])
 
     # Mise à jour en base
-    db = _load_db()
-    for u in db.get("users", []):
-        if u["username"] == session['username']:
-            if new_email:
-                u["email"] = new_email
-            if new_username and new_username != current_user["username"]:
-                old_username = current_user["username"]
-                u["username"] = new_username
-
-                # Mettre à jour tous les tweets avec l'ancien username
-                tweets_db = _load_tweets()
-                for tweet in tweets_db.get("tweets", []):
-                    if tweet["username"] == old_username:
-                        tweet["username"] = new_username
-                    if tweet.get("replies"):
-                        for r in tweet["replies"]:
-                            if r["username"] == old_username:
-                                r["username"] = new_username
-                _save_tweets(tweets_db)  # n'oublie pas de sauvegarder après modification
-
-                # Mettre à jour la session après avoir changé les tweets
-                session['username'] = new_username
-            if new_password:
-                hashed, salt = _hash_password(new_password)
-                u["password_hash"] = hashed
-                u["salt"] = salt
-            break
-
-    _save_db(db)
+    with users_transaction() as db:
+        for u in db.get("users", []):
+            if u["username"] == session['username']:
+                if new_email:
+                    u["email"] = new_email
+                if new_username and new_username != current_user["username"]:
+                    # Les tweets, likes et abonnements pointent vers l'uid :
+                    # rien d'autre à réécrire
+                    forget_cached_user(u["username"])
+                    u["username"] = new_username
+                    session['username'] = new_username
+                if new_password:
+                    hashed, salt = _hash_password(new_password)
+                    u["password_hash"] = hashed
+                    u["salt"] = salt
+                break
+
+        _save_db(db)
     flash("Profil mis à jour avec succès !")
     return redirect(url_for('profile'))
 
 @app.route("/explore")
 def explore():
-    return render_template("explore.html")
+    # Tendances tenues à jour à chaque post : pas de relecture des tweets
+    # Tirage au sort dans le tableau des ids : le coût ne dépend que de DISCOVER_SIZE
+    discover = db_tweet_utils.sample_tweets(DISCOVER_SIZE, DISCOVER_MAX_AGE, exclude_reported=True)
+    if not discover:
+        discover = db_tweet_utils.sample_tweets(DISCOVER_SIZE, exclude_reported=True)
+    for t in discover:
+        t["date"] = db_tweet_utils._format_date(t.get("date", ""))
+    return render_template("explore.html", trending=trending_utils.get_trending(), discover=discover)
 
 @app.route("/search_user")
 def search_user():
-    query = request.args.get("q", "").strip().lower()
-    db = _load_db()
-    users = db.get("users", [])
-    matches = sorted([u["username"] for u in users if u["username"].lower().startswith(query)])
-    return jsonify(matches)
+    query = request.args.get("q", "").strip()
+    limit = request.args.get("limit", SEARCH_USER_LIMIT, type=int)
+    limit = max(1, min(limit, SEARCH_USER_MAX_LIMIT))
+    return jsonify(search_usernames(query, limit))
+
+@app.route("/search_tweets")
+def search_tweets_route():
+    query = request.args.get("q", "").strip()
+    limit = request.args.get("limit", search_utils.SEARCH_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, SEARCH_TWEETS_MAX_LIMIT))
+    # Index inversé : seuls les tweets qui contiennent les mots sont lus
+    tweets, next_cursor = search_utils.search_tweets(query, request.args.get("cursor"), limit)
+    return jsonify({
+        "tweets": [{
+            "tweet_id": t["tweet_id"],
+            "username": t["username"],
+            "date": db_tweet_utils._format_date(t.get("date", "")),
+            "content": t.get("content", ""),
+            "media_path": t.get("media_path"),
+        } for t in tweets],
+        "next_cursor": next_cursor,
+    })
 
 
     
@@ -282,12 +373,18 @@ def like_route(tweet_id):
         return jsonify({'error': 'Non connecté'}), 401
     try:
         like_tweet(tweet_id, session['username'])
+        forget_cached_tweet(tweet_id)
+        # Un seul accès au tweet pour les deux valeurs
+        view = timeline_view([cached_tweet(tweet_id)], session['username'])[0]
         return jsonify({
-            'liked': has_user_liked(tweet_id, session['username']),
-            'likes_count': get_likes_count(tweet_id)
+            'liked': view['liked'],
+            'likes_count': view['likes_count']
         })
     except TweetNotFound:
         return jsonify({'error': 'Tweet non trouvé'}), 404
+    except UserNotFoundError:
+        session.clear()  # compte renommé ou supprimé depuis la connexion
+        return jsonify({'error': 'Non connecté'}), 401
 
 #Répondre à un tweet
 @app.route("/reply/<tweet_id>", methods=["POST"])
@@ -300,8 +397,33 @@ def reply_route(tweet_id):
             add_reply(tweet_id, session['username'], content)
         except (TweetNotFound, TweetTooLong):
             pass
+        except UserNotFoundError:
+            session.clear()
+            return redirect(url_for('login'))
     return redirect(request.referrer or url_for('timeline'))
 
+#Réponses d'un tweet, une page à la fois ("Voir plus de réponses")
+@app.route("/tweet/<tweet_id>/replies")
+def replies_route(tweet_id):
+    if 'username' not in session:
+        return jsonify({'error': 'Non connecté'}), 401
+    limit = request.args.get("limit", db_tweet_utils.REPLIES_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, REPLIES_MAX_LIMIT))
+    try:
+        # Réponses rangées par tweet et triées par date : seule la page est lue
+        replies, next_cursor = db_tweet_utils.get_replies(tweet_id, request.args.get("cursor"), limit)
+    except TweetNotFound:
+        return jsonify({'error': 'Tweet non trouvé'}), 404
+    return jsonify({
+        "replies": [{
+            "reply_id": r["reply_id"],
+            "username": r["username"],
+            "date": r.get("date", ""),
+            "content": r.get("content", ""),
+        } for r in replies],
+        "next_cursor": next_cursor,
+    })
+
 
 #Retweet un tweet
 @app.route("/retweet/<tweet_id>", methods=["POST"])
@@ -320,6 +442,9 @@ def retweet_route(tweet_id):
             flash("Retweet annulé.")
     except TweetNotFound:
         flash("Tweet introuvable.")
+    except UserNotFoundError:
+        session.clear()
+        return redirect(url_for("login"))
     
     return redirect(request.referrer or url_for('timeline'))
 
@@ -345,16 +470,6 @@ def delete_account():
         flash('Aucun compte connecté.')
     return redirect(url_for('index'))
 # Ajout d'une photo de profil
-def load_db():
-    with open("database_auth.json", "r") as f:
-        return json.load(f)
-
-
-def save_db(data):
-    with open("database_auth.json", "w") as f:
-        json.dump(data, f, indent=4)
-
-
 @app.route('/upload_pfp', methods=['POST'])
 def upload_pfp():
     if 'username' not in session:
@@ -369,38 +484,56 @@ def upload_pfp():
     # 1️⃣ Lire l'image
     image_bytes = file.read()
 
-    # 2️⃣ Convertir en base64
-    image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    # 2️⃣ La ranger dans le store de fichiers (le user ne garde que le hash)
+    set_profile_picture(session["username"], image_bytes)
 
-    # 3️⃣ Charger DB JSON
-    db = load_db()
+    flash("Photo de profil mise à jour !")
+    return redirect(url_for('edit_profile'))
 
-    # 4️⃣ Trouver l'utilisateur
-    for user in db["users"]:
-        if user["username"] == session["username"]:
-            user["profile_picture"] = image_base64
-            break
+PFP_MAX_AGE = 31536000  # 1 an : l'URL versionnée (?v=<hash>) ne change jamais de contenu
+PFP_VERSION_LEN = 16  # caractères du hash de l'image gardés dans ?v=
 
-    # 5️⃣ Sauvegarder
-    save_db(db)
+@app.template_global()
+def pfp_url(username):
+    """URL de la photo de profil, versionnée par le hash de l'image pour le cache navigateur."""
+    user = cached_user(username)
+    if user and user.get("profile_picture_hash"):
+        return url_for('pfp', username=username, v=user["profile_picture_hash"][:PFP_VERSION_LEN])
+    return url_for('pfp', username=username)
 
-    flash("Photo de profil mise à jour !")
-    return redirect(url_for('edit_profile'))
+@app.template_global()
+def usernames(uids):
+    """Noms actuels d'une liste d'uid (abonnés, abonnements), sans les comptes supprimés."""
+    users = (cached_user_by_uid(uid) for uid in uids or [])
+    return [u["username"] for u in users if u is not None]
 
 #affichage de la pp
 @app.route('/pfp/<username>')
 def pfp(username):
-    db = load_db()
-
-    for user in db["users"]:
-        if user["username"] == username:
-            if user.get("profile_picture"):
-                # Convertir base64 → bytes
-                img = base64.b64decode(user["profile_picture"])
-                return Response(img, mimetype="image/*")
+    # Les anciennes photos (base64) sont migrées par python db_blob_utils.py, pas ici
+    user = get_user(username)
+    if user and user.get("profile_picture_hash"):
+        blob_hash = user["profile_picture_hash"]
+        try:
+            path = db_blob_utils.get_blob_path(blob_hash)
+        except db_blob_utils.BlobNotFound:
+            path = None
+        if path:
+            # ETag = hash du contenu : le navigateur revalide avec If-None-Match -> 304
+            response = send_file(os.path.abspath(path),
+                                 mimetype=user.get("profile_picture_mime") or "application/octet-stream",
+                                 etag=blob_hash,
+                                 conditional=True)
+            # Seule la version exacte donnée par pfp_url est mise en cache pour de bon
+            if request.args.get("v") == blob_hash[:PFP_VERSION_LEN]:
+                response.headers["Cache-Control"] = f"public, max-age={PFP_MAX_AGE}, immutable"
+            else:
+                # URL non versionnée : l'image peut changer, on revalide à chaque fois
+                response.headers["Cache-Control"] = "no-cache"
+            return response
 
     # Si pas de photo → image par défaut
-    return send_file("../static/images/default_pfp.jpg")
+    return send_file("../static/images/default_pfp.jpg", max_age=3600)
 
 @app.route('/add_bio', methods=['POST'])
 def add_bio():
@@ -408,20 +541,19 @@ def add_bio():
         return redirect(url_for('login'))
 
     new_bio = request.form.get('bio', '').strip()
-    db = _load_db()
+    with users_transaction() as db:
+        for u in db.get("users", []):
+            if u["username"] == session['username']:
 
-    for u in db.get("users", []):
-        if u["username"] == session['username']:
-            
-            # Si la clé bio n’existe pas OU n'est pas une string : on la force en string
-            if "bio" not in u or not isinstance(u["bio"], str):
-                u["bio"] = ""
+                # Si la clé bio n’existe pas OU n'est pas une string : on la force en string
+                if "bio" not in u or not isinstance(u["bio"], str):
+                    u["bio"] = ""
 
-            # On remplace par la nouvelle valeur
-            u["bio"] = new_bio
-            break
+                # On remplace par la nouvelle valeur
+                u["bio"] = new_bio
+                break
 
-    _save_db(db)
+        _save_db(db)
     flash("Biographie mise à jour avec succès !")
     return redirect(url_for('edit_profile'))
 
@@ -433,46 +565,59 @@ def report_tweet(tweet_id):
         return redirect(url_for("login"))
 
     current_user = session["username"]
-    db = _load_tweets()
-    tweets = db.get("tweets", [])
-
-    reported_tweet = None
-
-    # Chercher le tweet
-    for t in tweets:
-        if t["tweet_id"] == tweet_id:
-
-            # Initialiser le compteur et la liste des reporters si absents
-            if "reports" not in t or not isinstance(t["reports"], int):
-                t["reports"] = 0
-
-            if "reporters" not in t or not isinstance(t["reporters"], list):
-                t["reporters"] = []
 
-            # Vérifier si l'utilisateur a déjà signalé ce tweet
-            if current_user in t["reporters"]:
-                flash("Vous avez déjà signalé ce tweet.")
-                _save_tweets(db)
-                return redirect(request.referrer or url_for('timeline'))
-
-            # Ajouter ce user comme reporter
-            t["reporters"].append(current_user)
-
-            # Incrémenter
-            t["reports"] += 1
-            reported_tweet = t
-            break
+    try:
+        nb_reports = add_report(tweet_id, current_user)
+    except TweetNotFound:
+        nb_reports = 0
+    except AlreadyReported:
+        flash("Vous avez déjà signalé ce tweet.")
+        return redirect(request.referrer or url_for('timeline'))
+    except UserNotFoundError:
+        session.clear()
+        return redirect(url_for("login"))
 
-    # Supprimer si 3 reports ou plus
-    if reported_tweet and reported_tweet["reports"] >= 3:
-        tweets.remove(reported_tweet)
-        flash("Tweet supprimé après 3 signalements.")
+    # Supprimer si 3 reports ou plus (même chemin que delete_tweet : index + user à jour)
+    if nb_reports >= REPORTS_BEFORE_DELETE:
+        try:
+            delete_tweet(tweet_id)
+        except TweetNotFound:
+            pass  # déjà supprimé entre temps (autre signalement, modérateur...)
+        flash(f"Tweet supprimé après {REPORTS_BEFORE_DELETE} signalements.")
     else:
         flash("Tweet signalé.")
 
-    _save_tweets(db)
     return redirect(request.referrer or url_for('timeline'))
 
+#File de modération : tweets signalés, les plus urgents en premier
+@app.route("/moderation")
+def moderation_queue():
+    if not is_moderator():
+        return jsonify({'error': 'Réservé aux modérateurs'}), 403
+    limit = request.args.get("limit", moderation_utils.MODERATION_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MODERATION_MAX_LIMIT))
+    # Tête de la file de priorité : pas de parcours des tweets
+    tweets = moderation_utils.get_moderation_queue(limit)
+    return jsonify([{
+        "tweet_id": t["tweet_id"],
+        "username": t["username"],
+        "date": db_tweet_utils._format_date(t.get("date", "")),
+        "content": t.get("content", ""),
+        "reports": t["reports"],
+        "velocity": round(t["velocity"], 2),
+        "last_report": t.get("last_report"),
+    } for t in tweets])
+
+@app.route("/moderation/<tweet_id>/delete", methods=["POST"])
+def moderation_delete(tweet_id):
+    if not is_moderator():
+        return jsonify({'error': 'Réservé aux modérateurs'}), 403
+    try:
+        delete_tweet(tweet_id)
+    except TweetNotFound:
+        return jsonify({'error': 'Tweet non trouvé'}), 404
+    return jsonify({'deleted': tweet_id})
+
 @app.route("/follow/<username>", methods=["POST"])
 def follow(username):
     if "username" not in session:
@@ -484,39 +629,40 @@ def follow(username):
         flash("Tu ne peux pas t'abonner à toi-même.")
         return redirect(request.referrer or url_for("timeline"))
 
-    db = _load_db()
-    users = db.get("users", [])
+    with users_transaction() as db:
+        users = db.get("users", [])
 
-    user_to_follow = None
-    me = None
+        user_to_follow = None
+        me = None
 
-    # Trouver les deux utilisateurs
-    for u in users:
-        # On initialise toujours les champs follow ici :
-        if "followers" not in u or not isinstance(u["followers"], list):
-            u["followers"] = []
-        if "following" not in u or not isinstance(u["following"], list):
-            u["following"] = []
+        # Trouver les deux utilisateurs
+        for u in users:
+            # On initialise toujours les champs follow ici :
+            if "followers" not in u or not isinstance(u["followers"], list):
+                u["followers"] = []
+            if "following" not in u or not isinstance(u["following"], list):
+                u["following"] = []
 
-        if u["username"] == username:
-            user_to_follow = u
-        if u["username"] == current_user:
-            me = u
+            if u["username"] == username:
+                user_to_follow = u
+            if u["username"] == current_user:
+                me = u
 
-    if not user_to_follow or not me:
-        flash("Utilisateur introuvable.")
-        return redirect(url_for("timeline"))
+        if not user_to_follow or not me:
+            flash("Utilisateur introuvable.")
+            return redirect(url_for("timeline"))
 
-    # Déjà abonné ?
-    if username in me["following"]:
-        flash("Tu es déjà abonné à cet utilisateur.")
-        return redirect(request.referrer or url_for("profil_autre", username=username))
+        # Déjà abonné ? (les abonnements sont des uid)
+        if user_to_follow["uid"] in me["following"]:
+            flash("Tu es déjà abonné à cet utilisateur.")
+            return redirect(request.referrer or url_for("profil_autre", username=username))
 
-    # Abonnement
-    me["following"].append(username)
-    user_to_follow["followers"].append(current_user)
+        # Abonnement
+        me["following"].append(user_to_follow["uid"])
+        user_to_follow["followers"].append(me["uid"])
 
-    _save_db(db)
+        _save_db(db)
+    invalidate_home_timeline(current_user)
 
     flash(f"Tu t'es abonné à {username}.")
     return redirect(request.referrer or url_for("profil_autre", username=username))
@@ -532,43 +678,45 @@ def unfollow(username):
         flash("Tu ne peux pas te désabonner de toi-même.")
         return redirect(request.referrer or url_for("timeline"))
 
-    db = _load_db()
-    users = db.get("users", [])
+    with users_transaction() as db:
+        users = db.get("users", [])
 
-    user_to_unfollow = None
-    me = None
+        user_to_unfollow = None
+        me = None
 
-    for u in users:
-        # Initialiser si manquant
-        if "followers" not in u or not isinstance(u["followers"], list):
-            u["followers"] = []
-        if "following" not in u or not isinstance(u["following"], list):
-            u["following"] = []
+        for u in users:
+            # Initialiser si manquant
+            if "followers" not in u or not isinstance(u["followers"], list):
+                u["followers"] = []
+            if "following" not in u or not isinstance(u["following"], list):
+                u["following"] = []
 
-        if u["username"] == username:
-            user_to_unfollow = u
-        if u["username"] == current_user:
-            me = u
+            if u["username"] == username:
+                user_to_unfollow = u
+            if u["username"] == current_user:
+                me = u
 
-    if not user_to_unfollow or not me:
-        flash("Utilisateur introuvable.")
-        return redirect(url_for("timeline"))
+        if not user_to_unfollow or not me:
+            flash("Utilisateur introuvable.")
+            return redirect(url_for("timeline"))
 
-    # Vérifie s'il était abonné
-    if username not in me["following"]:
-        flash("Tu n'es pas abonné à cet utilisateur.")
-        return redirect(request.referrer or url_for("profil_autre", username=username))
+        # Vérifie s'il était abonné
+        if user_to_unfollow["uid"] not in me["following"]:
+            flash("Tu n'es pas abonné à cet utilisateur.")
+            return redirect(request.referrer or url_for("profil_autre", username=username))
 
-    # Désabonnement
-    me["following"].remove(username)
-    if current_user in user_to_unfollow["followers"]:
-        user_to_unfollow["followers"].remove(current_user)
+        # Désabonnement
+        me["following"].remove(user_to_unfollow["uid"])
+        if me["uid"] in user_to_unfollow["followers"]:
+            user_to_unfollow["followers"].remove(me["uid"])
 
-    _save_db(db)
+        _save_db(db)
+    invalidate_home_timeline(current_user)
 
     flash(f"Tu t'es désabonné de {username}.")
     return redirect(request.referrer or url_for("profil_autre", username=username))
 
 
 if __name__ == '__main__':
+    migrate_profile_pictures()  # anciennes photos en base64 -> store de fichiers
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,20 +1,39 @@
 import json
 import os
+import base64
 import hashlib
 import secrets
-from db_tweet_utils import get_tweet, TweetNotFound
+import heapq
+import threading
+import uuid
+import traceback
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import db_tweet_utils
+import db_blob_utils
+import db_file_utils
+from db_file_utils import CorruptDatabaseError
+from db_tweet_utils import get_tweet, get_tweets, TweetNotFound
 
 ############## IDÉES AMÉLIORATIONS ##############
-    # Si DB trop grande, faudra réfléchir à comment ne pas la load sur chaque fonction
     # Trouver user pas email => fonction commune avec le search by username?
     # Delete by email? => fonction commune avec delete by username?
+    # Reprendre au démarrage les suppressions de compte interrompues (le job est perdu si le process s'arrête)
     #
 
 #------------ Variables globales ------------#
 DB_FILE = "database_auth.json"  #chemin de la DB
+BACKEND = os.environ.get("TWEETINSA_BACKEND", "json")  #"json" (DB_FILE) ou "sqlite" (db_sqlite_utils.SQLITE_FILE)
 
 NB_USERS = 0 #Compteur utilisateurs
 
+SUGGESTION_MIN_SCORE = 0.2 #similarité minimale pour suggérer un username
+
+DELETED_USERNAME = "utilisateur supprimé"  #nom affiché pour un uid qui ne correspond plus à aucun compte
+DELETE_WORKERS = 1  #nb de threads qui nettoient les comptes supprimés en arrière-plan
+_EXECUTOR = None
+
 BASE_DIR = os.path.dirname(DB_FILE) #répertoire dans lequel se trouve la db
 
 # Créer le fichier database_auth.json s'il n'existe pas
@@ -46,11 +65,358 @@ class UserNotFoundError(Exception):
     pass
 
 
+#------------ Cache en mémoire ------------#
+def _trigrams(name):
+    """
+    Trigrammes d'un nom, en minuscules, avec des espaces autour pour que le
+    début et la fin du nom comptent : "Léa" -> {"  l", " lé", "léa", "éa "}.
+    """
+    padded = "  " + name.lower() + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _normalize_email(email):
+    """Email sous forme canonique pour l'index : sans espaces autour, en minuscules."""
+    return email.strip().lower() if isinstance(email, str) else email
+
+
+class UserStore:
+    """
+    Garde la DB des utilisateurs en mémoire, avec des index :
+    - uid -> user, username -> user et email (en minuscules) -> user ;
+    - liste triée des usernames en minuscules, pour l'autocomplétion par
+      préfixe (bisect : coût proportionnel au nombre de résultats) ;
+    - trigramme -> usernames, pour suggérer des noms proches quand un
+      profil n'existe pas (tolère les fautes de frappe).
+
+    Chaque user a un "uid" qui ne change jamais : les tweets, réponses,
+    likes, retweets, signalements et abonnements pointent vers lui, et le
+    username n'est résolu qu'à l'affichage. Un renommage ne touche donc que
+    le user. Les comptes créés avant les uid gardent leur username
+    d'origine comme uid (c'est ce que contiennent déjà leurs tweets).
+
+    - Le fichier n'est lu qu'au premier accès, puis relu seulement s'il a
+      été modifié par quelqu'un d'autre (date de modification / taille).
+    - add et remove mettent les index à jour directement.
+    - save(db) reconstruit les index, car l'appelant a pu modifier des
+      users à la main (changement d'email, de pseudo...).
+    - Les écritures se font dans une transaction (verrou partagé entre
+      threads et workers, puis relecture du fichier s'il a changé) et le
+      fichier est réécrit de façon atomique (temporaire + fsync + renommage).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._stamp = None
+        self._by_uid = {}
+        self._by_username = {}
+        self._by_email = {}
+        self._prefix = []  # liste triée de (username en minuscules, username)
+        self._trigrams = {}  # trigramme -> set de usernames
+        self._lock = db_file_utils.file_lock(path)  # écritures, entre threads et workers
+        self._cache_lock = threading.RLock()  # rechargement et index en mémoire (lectures comprises)
+
+    def _file_stamp(self):
+        """
+        Empreinte du fichier sur le disque : (mtime, taille, inode).
+        None si le fichier n'existe pas.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _read_file(self):
+        """
+        Lit le fichier JSON.
+        Si le fichier n'existe pas ou est vide, retourne {"users": []}.
+        S'il est corrompu, lève CorruptDatabaseError.
+        """
+        return db_file_utils.read_json(self.path, {"users": []})
+
+    def _reindex(self):
+        """
+        Reconstruit les index uid, username et email. Les nouveaux index sont
+        construits à part puis mis en place d'un coup : une lecture pendant
+        la reconstruction voit les anciens, jamais des index à moitié remplis.
+        """
+        by_uid, by_username, by_email, prefix, trigrams = {}, {}, {}, [], {}
+        with self._cache_lock:
+            for u in self._db.get("users", []):
+                u.setdefault("uid", u["username"])  # compte d'avant les uid
+                by_uid.setdefault(u["uid"], u)
+                if u.get("username") not in by_username:
+                    by_username[u["username"]] = u
+                    prefix.append((u["username"].lower(), u["username"]))
+                    for tri in _trigrams(u["username"]):
+                        trigrams.setdefault(tri, set()).add(u["username"])
+                if u.get("email"):
+                    by_email.setdefault(_normalize_email(u["email"]), u)
+            prefix.sort()  # un seul tri (insort à chaque user serait quadratique)
+            self._by_uid, self._by_username, self._by_email = by_uid, by_username, by_email
+            self._prefix, self._trigrams = prefix, trigrams
+
+    def _index(self, user):
+        """Ajoute un user aux index (le premier arrivé garde la place en cas de doublon)."""
+        user.setdefault("uid", user["username"])  # compte d'avant les uid
+        self._by_uid.setdefault(user["uid"], user)
+        if user.get("username") not in self._by_username:
+            self._by_username[user["username"]] = user
+            insort(self._prefix, (user["username"].lower(), user["username"]))
+            for tri in _trigrams(user["username"]):
+                self._trigrams.setdefault(tri, set()).add(user["username"])
+        if user.get("email"):
+            self._by_email.setdefault(_normalize_email(user["email"]), user)
+
+    def _unindex(self, user):
+        """Retire un user des index."""
+        if self._by_uid.get(user.get("uid")) is user:
+            del self._by_uid[user["uid"]]
+        if self._by_username.get(user.get("username")) is user:
+            del self._by_username[user["username"]]
+            entry = (user["username"].lower(), user["username"])
+            i = bisect_left(self._prefix, entry)
+            if i < len(self._prefix) and self._prefix[i] == entry:
+                del self._prefix[i]
+            for tri in _trigrams(user["username"]):
+                names = self._trigrams.get(tri)
+                if names is not None:
+                    names.discard(user["username"])
+                    if not names:
+                        del self._trigrams[tri]
+        email = _normalize_email(user.get("email"))
+        if self._by_email.get(email) is user:
+            del self._by_email[email]
+
+    def data(self):
+        """
+        Donne la DB des users, rechargée seulement si le fichier a changé.
+
+        Returns
+        -------
+        dict
+            Database des utilisateurs (l'objet en mémoire, pas une copie).
+        """
+        with self._cache_lock:
+            if self._db is None or self._file_stamp() != self._stamp:
+                self._stamp = self._file_stamp()
+                self._db = self._read_file()
+                self._db.setdefault("users", [])
+                self._reindex()
+            return self._db
+
+    def get(self, username):
+        """User correspondant au username (O(1)), None si inconnu."""
+        self.data()
+        return self._by_username.get(username)
+
+    def get_by_uid(self, uid):
+        """User correspondant à l'uid (O(1)), None si inconnu (ou supprimé)."""
+        self.data()
+        return self._by_uid.get(uid)
+
+    def get_by_email(self, email):
+        """User correspondant à l'email, sans tenir compte de la casse (O(1)), None si inconnu."""
+        self.data()
+        return self._by_email.get(_normalize_email(email))
+
+    def search_prefix(self, prefix, limit):
+        """
+        Usernames qui commencent par prefix (sans tenir compte de la casse),
+        dans l'ordre alphabétique.
+
+        Parameters
+        ----------
+        prefix : str
+            Début du username.
+        limit : int
+            Nombre maximum de résultats.
+
+        Returns
+        -------
+        list of str
+            Usernames trouvés.
+        """
+        self.data()
+        prefix = prefix.lower()
+        matches = []
+        with self._cache_lock:  # add / remove insèrent et retirent sur place
+            i = bisect_left(self._prefix, (prefix,))
+            while i < len(self._prefix) and len(matches) < limit:
+                lowered, username = self._prefix[i]
+                if not lowered.startswith(prefix):
+                    break
+                matches.append(username)
+                i += 1
+        return matches
+
+    def similar(self, query, limit):
+        """
+        Usernames les plus proches de query, classés par similarité
+        (trigrammes en commun / trigrammes au total).
+
+        Parameters
+        ----------
+        query : str
+            Nom recherché.
+        limit : int
+            Nombre maximum de résultats.
+
+        Returns
+        -------
+        list of str
+            Usernames trouvés, du plus proche au moins proche.
+        """
+        self.data()
+        query_tris = _trigrams(query)
+        shared = {}  # username -> nb de trigrammes en commun avec query
+        # Sous le verrou : add / remove modifient ces sets sur place
+        with self._cache_lock:
+            for tri in query_tris:
+                for username in self._trigrams.get(tri, ()):
+                    shared[username] = shared.get(username, 0) + 1
+
+        scored = []
+        lowered = query.lower()
+        for username, common in shared.items():
+            score = common / (len(query_tris) + len(_trigrams(username)) - common)
+            if lowered in username.lower():
+                score += 1  # les noms qui contiennent la recherche passent devant
+            if score >= SUGGESTION_MIN_SCORE:
+                scored.append((score, username))
+        return [username for _, username in heapq.nlargest(limit, scored)]
+
+    @contextmanager
+    def transaction(self):
+        """
+        Prend le verrou (threads et workers) et recharge la DB si un autre
+        worker l'a modifiée. À utiliser autour de tout cycle
+        lecture-modification-sauvegarde. Réentrant.
+
+        Yields
+        ------
+        dict
+            Database des utilisateurs, à jour.
+        """
+        with self._lock:
+            yield self.data()
+
+    def add(self, user):
+        """Ajoute un user, met à jour les index et sauvegarde."""
+        with self.transaction() as db:
+            with self._cache_lock:
+                db["users"].append(user)
+                self._index(user)
+            self._write()
+
+    def remove(self, username):
+        """
+        Retire un user, met à jour les index et sauvegarde.
+
+        Returns
+        -------
+        dict
+            Le user retiré, None si inconnu.
+        """
+        with self.transaction() as db:
+            user = self._by_username.get(username)
+            if user is None:
+                return None
+            with self._cache_lock:
+                db["users"].remove(user)
+                self._unindex(user)
+                # Un éventuel doublon (même email) reprend la place dans l'index
+                for u in db["users"]:
+                    if _normalize_email(u.get("email")) == _normalize_email(user.get("email")):
+                        self._index(u)
+                        break
+            self._write()
+        return user
+
+    def _write(self):
+        """Écrit la DB en mémoire sur le disque (atomique)."""
+        db_file_utils.write_json(self.path, self._db)
+        self._stamp = self._file_stamp()
+
+    def save(self, db=None):
+        """
+        Sauvegarde la DB.
+
+        Parameters
+        ----------
+        db : dict, optional
+            Database à sauver : les index sont reconstruits, car l'appelant a pu
+            modifier des usernames / emails.
+            Par défaut, sauve celle en mémoire sans toucher aux index (à utiliser
+            quand seuls des champs non indexés ont changé : tweets, bio...).
+        """
+        with self._lock:
+            if db is not None:
+                with self._cache_lock:
+                    self._db = db
+                    self._reindex()
+            else:
+                self.data()
+            self._write()
+
+    def invalidate(self):
+        """Oublie le cache : la prochaine lecture relira le fichier."""
+        self._db = None
+        self._stamp = None
+        self._by_uid = {}
+        self._by_username = {}
+        self._by_email = {}
+        self._prefix = []
+        self._trigrams = {}
+
+
+_STORE = None
+
+def _store():
+    """
+    Donne le UserStore associé à DB_FILE (ou le SQLiteUserStore si BACKEND
+    vaut "sqlite").
+    Si DB_FILE ou BACKEND a changé (ex : tests sur une DB temporaire), on en crée un nouveau.
+
+    Returns
+    -------
+    UserStore
+        Cache de la DB des utilisateurs.
+    """
+    global _STORE
+    if BACKEND == "sqlite":
+        import db_sqlite_utils
+        store_class, path = db_sqlite_utils.SQLiteUserStore, db_sqlite_utils.SQLITE_FILE
+    else:
+        store_class, path = UserStore, DB_FILE
+    if _STORE is None or type(_STORE) is not store_class or _STORE.path != path:
+        _STORE = store_class(path)
+    return _STORE
+
+
 #------------ Fonctions internes ------------#
+def users_transaction():
+    """
+    Verrou sur la DB des users, pour un cycle _load_db / modification /
+    _save_db sans perdre les écritures des autres workers :
+
+        with users_transaction() as db:
+            ...
+            _save_db(db)
+
+    Returns
+    -------
+    context manager
+        Donne la database des utilisateurs, à jour.
+    """
+    return _store().transaction()
+
 def _load_db():
     """
-    Charge la database contenant les users.
-    Si le fichier n'existe pas, est vide ou corrompu, retourne {"users": []}.
+    Charge la database contenant les users (depuis le cache en mémoire).
+    Si le fichier n'existe pas ou est vide, retourne {"users": []}.
+    S'il est corrompu, lève CorruptDatabaseError (plutôt que de l'écraser).
 
     Returns
     -------
@@ -58,14 +424,7 @@ def _load_db():
         Database des utilisateurs.
 
     """
-    try:
-        with open(DB_FILE, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content:  # fichier vide
-                return {"users": []}
-            return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"users": []}
+    return _store().data()
 
 
 def _save_db(db):
@@ -81,8 +440,7 @@ def _save_db(db):
     -------
     None.
     """
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2)
+    _store().save(db)
 
 def _hash_password(password, salt=None):
     """
@@ -122,6 +480,44 @@ def _refresh_count():
     
 _refresh_count()  #On met à jour NB_USERS dès l'importation du module
 
+def _executor():
+    """Pool de threads créé à la première suppression de compte."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=DELETE_WORKERS, thread_name_prefix="delete-user")
+    return _EXECUTOR
+
+def _purge_account(user):
+    """
+    Nettoie ce qui reste d'un compte supprimé : ses likes, retweets et
+    réponses (via l'index d'activité des tweets), et les abonnements des
+    autres users vers lui (via ses propres listes followers / following).
+    Seuls les tweets et users concernés sont modifiés.
+    Les erreurs sont affichées mais ne remontent pas.
+
+    Parameters
+    ----------
+    user : dict
+        Le user retiré de la DB.
+    """
+    uid = user["uid"]
+    try:
+        db_tweet_utils.purge_user_activity(uid)
+        with users_transaction():
+            for other_uid in user.get("following") or []:
+                other = _store().get_by_uid(other_uid)
+                if other is not None and uid in other.get("followers", []):
+                    other["followers"].remove(uid)
+            for other_uid in user.get("followers") or []:
+                other = _store().get_by_uid(other_uid)
+                if other is not None and uid in other.get("following", []):
+                    other["following"].remove(uid)
+                    db_tweet_utils.invalidate_home_timeline(other["username"])
+            _store().save()
+    except Exception as e:
+        print(f"Erreur nettoyage du compte {uid} :", e)
+        traceback.print_exc()
+
 
 
 #------------ Fonctions publiques ------------#
@@ -161,8 +557,7 @@ def test_username(username):
     bool
         True si username n'est pas déjà utilisé.
     """
-    db = _load_db()
-    if any(u["username"] == username for u in db["users"]):
+    if _store().get(username) is not None:
         raise UsernameExistsError(f"Nom d'utilisateur '{username}' déjà utilisé!")
     return True
 
@@ -185,8 +580,7 @@ def test_email(email):
     bool
         True si emmail n'est pas  déjà utilisé.
     """
-    db = _load_db()
-    if any(u["email"] == email for u in db["users"]):
+    if _store().get_by_email(email) is not None:
         raise EmailExistsError(f"Email '{email}' déjà utilisé!")
     return True
 
@@ -215,25 +609,26 @@ def add_user(username, email, password):
     None.
 
     """
-    db = _load_db()
-    test_username(username)  # Vérifier si le nom d'utilisateur est unique
-    test_email(email)  # Vérifier si l'email est unique
-    test_password(password)  # Vérifier les critères du mot de passe
-    hashed, salt = _hash_password(password)
-    db["users"].append({
-        "username": username,
-        "email": email,
-        "password_hash": hashed,
-        "salt": salt,
-        "tweets": [] #liste des tweets de l'utilisateur
-    })
-    try:
-        _save_db(db)
-        _refresh_count()
-        print(f"Utilisateur {username} enregistré dans {DB_FILE}")
-    except Exception as e:
-        print(f"Erreur lors de l'enregistrement de l'utilisateur: {e}")
-        raise
+    # Vérifications et ajout sous verrou : deux workers ne peuvent pas créer le même compte
+    with users_transaction():
+        test_username(username)  # Vérifier si le nom d'utilisateur est unique
+        test_email(email)  # Vérifier si l'email est unique
+        test_password(password)  # Vérifier les critères du mot de passe
+        hashed, salt = _hash_password(password)
+        user = {
+            "uid": uuid.uuid4().hex,  #identifiant fixe (le username peut changer)
+            "username": username,
+            "email": email,
+            "password_hash": hashed,
+            "salt": salt
+        }
+        try:
+            _store().add(user)
+            _refresh_count()
+            print(f"Utilisateur {username} enregistré dans {DB_FILE}")
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement de l'utilisateur: {e}")
+            raise
 
 
 def get_user(username):
@@ -251,15 +646,71 @@ def get_user(username):
         Infos de l'utilisateur.
     None si inconnu.
     """
-    db = _load_db()
-    for u in db["users"]:
-        if u["username"] == username:
-            return u
-    return None
+    return _store().get(username)
+
+def get_user_by_uid(uid):
+    """
+    Chercher un utilisateur par son identifiant (fixe, contrairement au username).
+
+    Parameters
+    ----------
+    uid : str
+        Identifiant de l'utilisateur.
+
+    Returns
+    -------
+    u : dict
+        Infos de l'utilisateur.
+    None si inconnu (ou compte supprimé).
+    """
+    return _store().get_by_uid(uid)
+
+def get_uid(username):
+    """
+    Identifiant d'un utilisateur, à partir de son username.
+
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur.
+
+    Raises
+    ------
+    UserNotFoundError
+        Si l'utilisateur n'existe pas (ex : session d'un compte renommé ou
+        supprimé) : on n'enregistre jamais un nom à la place d'un uid.
+
+    Returns
+    -------
+    str
+        uid du compte.
+    """
+    user = _store().get(username)
+    if user is None:
+        raise UserNotFoundError(f"Utilisateur '{username}' introuvable.")
+    return user["uid"]
+
+def get_username(uid):
+    """
+    Nom à afficher pour un uid (résolu à l'affichage : un renommage est
+    visible partout sans réécrire les tweets).
+
+    Parameters
+    ----------
+    uid : str
+        Identifiant de l'utilisateur.
+
+    Returns
+    -------
+    str
+        Username actuel, DELETED_USERNAME si le compte n'existe plus.
+    """
+    user = _store().get_by_uid(uid)
+    return user["username"] if user is not None else DELETED_USERNAME
 
 def get_user_by_email(email):
     """
-    Chercher un utilisateur par son email.
+    Chercher un utilisateur par son email (sans tenir compte de la casse).
 
     Parameters
     ----------
@@ -272,66 +723,75 @@ def get_user_by_email(email):
         Infos de l'utilisateur.
     None si inconnu.
     """
-    db = _load_db()
-    for u in db["users"]:
-        if u["email"] == email:
-            return u
-    return None
+    return _store().get_by_email(email)
 
-def delete_user(username):
+def search_usernames(prefix, limit=10):
     """
-    Supprime l'utilisateur.
+    Autocomplétion : usernames qui commencent par prefix.
 
     Parameters
     ----------
-    username : str
-        Nom d'utilisateur du compte à supprimer.
+    prefix : str
+        Début du username (la casse est ignorée).
+    limit : int, optional
+        Nombre maximum de résultats (10 par défaut).
 
     Returns
     -------
-    None.
+    list of str
+        Usernames trouvés, dans l'ordre alphabétique.
     """
-    db = _load_db()
-    before = len(db["users"])
-    db["users"] = [u for u in db["users"] if u["username"] != username]
-    after = len(db["users"])
-    if after==before:  #Aucun utilisateur supprimé
-        raise UserNotFoundError(f"Utilisateur '{username}' introuvable!")
-    _save_db(db)
-    _refresh_count()
-        # ⬅️ On anonymise maintenant les tweets liés à ce user
-    anonymize_tweets(username)
+    return _store().search_prefix(prefix, limit)
 
-def anonymize_tweets(username):
+def suggest_usernames(query, limit=5):
     """
-    Anonymise les tweets d'un utilisateur supprimé en remplaçant son
-    nom d'utilisateur par "utilisateur supprimé".
+    Suggestions quand un profil n'existe pas : usernames les plus proches
+    de query, même avec des fautes de frappe.
 
     Parameters
     ----------
-    username : str
-        Nom d'utilisateur du compte supprimé.
+    query : str
+        Nom recherché.
+    limit : int, optional
+        Nombre maximum de suggestions (5 par défaut).
 
     Returns
     -------
-    None.
+    list of str
+        Usernames proposés, du plus proche au moins proche.
     """
-    db_tweets_file = "DB_Tweets.json"
-    try:
-        with open(db_tweets_file, "r", encoding="utf-8") as f:
-            db_tweets = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print(f"Erreur : Impossible de charger {db_tweets_file} pour anonymisation.")
-        return
+    return _store().similar(query, limit)
 
-    for tweet in db_tweets.get("tweets", []):
-        if tweet.get("username") == username:
-            tweet["username"] = "utilisateur supprimé"
+def delete_user(username):
+    """
+    Supprime l'utilisateur.
+
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur du compte à supprimer.
 
-    with open(db_tweets_file, "w", encoding="utf-8") as f:
-        json.dump(db_tweets, f, indent=2)
-    #print(f"Tweets de l'utilisateur '{username}' anonymisés.")
+    Le compte disparaît tout de suite ; ses likes, retweets, réponses et
+    abonnements sont retirés en arrière-plan (voir _purge_account). Ses
+    tweets restent : son uid ne correspond plus à aucun compte, ils
+    s'affichent donc avec DELETED_USERNAME.
+
+    Raises
+    ------
+    UserNotFoundError
+        Si l'utilisateur n'existe pas.
 
+    Returns
+    -------
+    concurrent.futures.Future
+        Le nettoyage en cours (permet de l'attendre, ex : tests).
+    """
+    db_tweet_utils.invalidate_home_timeline(username)
+    user = _store().remove(username)
+    if user is None:  #Aucun utilisateur supprimé
+        raise UserNotFoundError(f"Utilisateur '{username}' introuvable!")
+    _refresh_count()
+    return _executor().submit(_purge_account, user)
 
 def authenticate(username, password):
     """
@@ -355,6 +815,63 @@ def authenticate(username, password):
     hashed, _ = _hash_password(password, u["salt"])
     return hashed == u["password_hash"]
 
+def set_profile_picture(username, image_bytes):
+    """
+    Change la photo de profil d'un utilisateur.
+    L'image est rangée dans le store de fichiers (db_blob_utils), le user ne
+    garde que son hash et son type MIME.
+
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur.
+    image_bytes : bytes
+        Contenu de l'image.
+
+    Raises
+    ------
+    UserNotFoundError
+        Si l'utilisateur n'existe pas.
+
+    Returns
+    -------
+    str
+        Hash de l'image.
+    """
+    blob_hash = db_blob_utils.put_blob(image_bytes)
+    with users_transaction():
+        u = _store().get(username)
+        if u is None:
+            raise UserNotFoundError(f"Utilisateur '{username}' introuvable.")
+        u["profile_picture_hash"] = blob_hash
+        u["profile_picture_mime"] = db_blob_utils.guess_mimetype(image_bytes)
+        u.pop("profile_picture", None)  # ancien format (base64)
+        _store().save()
+    return blob_hash
+
+def migrate_profile_pictures():
+    """
+    Migration : sort les photos de profil stockées en base64 dans la DB
+    (ancien format) vers le store de fichiers.
+
+    Returns
+    -------
+    int
+        Nombre de photos migrées.
+    """
+    nb = 0
+    with users_transaction() as db:
+        for u in db["users"]:
+            if u.get("profile_picture"):
+                image_bytes = base64.b64decode(u["profile_picture"])
+                u["profile_picture_hash"] = db_blob_utils.put_blob(image_bytes)
+                u["profile_picture_mime"] = db_blob_utils.guess_mimetype(image_bytes)
+                del u["profile_picture"]
+                nb += 1
+        if nb:
+            _store().save()
+    return nb
+
 def count_users():
     """
     Renvoie le nombre d'utilisateurs.
@@ -366,51 +883,62 @@ def count_users():
     """
     return NB_USERS
 
-def add_tweet(username, tweet_content):
-    """
-    Ajoute un tweet à l'utilisateur.
+def get_user_tweets_page(username, before=None, limit=20):
     """
-    db = _load_db()
-    for u in db["users"]:
-        if u["username"] == username:
-            u["tweets"].append({
-                "content": tweet_content,
-                "date": "2025-10-26"  # À remplacer par la date actuelle plus tard
-            })
-            _save_db(db)
-            return True
-    return False
+    Donne une page des tweets d'un utilisateur, du plus récent au plus ancien.
+    On part de l'index par auteur de la DB des tweets (trié par date) : une
+    page coûte le même prix quel que soit le nombre de tweets du compte.
 
-def get_user_tweets(username):
-    """
-    Récupère tous les tweets complets d'un utilisateur à partir des IDs
-    stockés dans la base des utilisateurs.
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur.
+    before : str, optional
+        Curseur renvoyé par la page précédente. None pour la première page.
+        Un curseur invalide est ignoré (première page).
+    limit : int, optional
+        Nombre maximum de tweets dans la page. None pour tous les tweets.
+
+    Raises
+    ------
+    UserNotFoundError
+        Si l'utilisateur n'existe pas.
+
+    Returns
+    -------
+    tweets : list of dict
+        Copies des tweets de la page, avec la date formatée. Les ids qui ne
+        correspondent plus à aucun tweet sont ignorés.
+    next_cursor : str
+        Curseur de la page suivante, None si c'est la dernière.
     """
     user = get_user(username)
     if not user:
         raise UserNotFoundError(f"Utilisateur '{username}' introuvable.")
-    
-    tweet_ids = user.get("tweets", user.get("tweets", []))  # compatibilité entre noms de clé
-    
-    tweets = []
-    for tweet_id in tweet_ids:
-        try:
-            tweet = get_tweet(tweet_id)
-            tweets.append(tweet)
-        except TweetNotFound:
-            print(f"Tweet {tweet_id} introuvable — ignoré.")
-            continue
 
-    # Trier du plus récent au plus ancien si la clé "date" existe
-    tweets.sort(key=lambda t: t.get("date", ""), reverse=True)
-
-    # Formatage lisible de la date
+    page, last = db_tweet_utils._store().page(db_tweet_utils._parse_cursor(before), limit, uid=user["uid"])
+    tweets = get_tweets(t["tweet_id"] for t in page)  # un seul passage sur le cache
     for t in tweets:
-        try:
-            t["date"] = t["date"].replace("T", " ")[:16]
-        except Exception:
-            pass
+        t["date"] = db_tweet_utils._format_date(t.get("date", ""))
+    return tweets, db_tweet_utils._make_cursor(last)
 
-    return tweets
+def get_user_tweets(username, limit=None, before=None):
+    """
+    Récupère les tweets complets d'un utilisateur (index par auteur de la
+    DB des tweets), du plus récent au plus ancien.
 
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur.
+    limit : int, optional
+        Nombre maximum de tweets. Par défaut, tous.
+    before : str, optional
+        Curseur de pagination (voir get_user_tweets_page).
 
+    Returns
+    -------
+    list of dict
+        Copies des tweets, avec la date formatée.
+    """
+    return get_user_tweets_page(username, before, limit)[0]
@@ -0,0 +1,130 @@
+import os
+import hashlib
+import tempfile
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Supprimer les blobs qui ne sont plus référencés par aucun user (ramasse-miettes)
+
+#------------ Variables globales ------------#
+BLOB_DIR = "./blobs"  #dossier où sont rangés les fichiers (images de profil...)
+
+# Signatures des formats d'image acceptés : (début du fichier, type MIME)
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+#------------ Classes Exception ------------#
+class BlobNotFound(Exception):
+    """Levée quand aucun fichier ne correspond au hash demandé"""
+    pass
+
+
+#------------ Fonctions publiques ------------#
+def guess_mimetype(data):
+    """
+    Devine le type MIME d'une image à partir de ses premiers octets.
+
+    Parameters
+    ----------
+    data : bytes
+        Contenu du fichier.
+
+    Returns
+    -------
+    str
+        Type MIME ("image/png"...), "application/octet-stream" si inconnu.
+    """
+    for signature, mimetype in _SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+def blob_path(blob_hash):
+    """
+    Chemin du fichier correspondant à un hash.
+    Les fichiers sont répartis dans des sous-dossiers (2 premiers caractères du
+    hash) pour ne pas avoir des milliers de fichiers dans un seul dossier.
+
+    Parameters
+    ----------
+    blob_hash : str
+        Hash SHA-256 (hexadécimal) du contenu.
+
+    Returns
+    -------
+    str
+        Chemin du fichier.
+    """
+    return os.path.join(BLOB_DIR, blob_hash[:2], blob_hash)
+
+def put_blob(data):
+    """
+    Range un contenu dans le store, sous le nom de son hash.
+    Un contenu déjà présent n'est pas réécrit (même contenu = même hash).
+
+    Parameters
+    ----------
+    data : bytes
+        Contenu du fichier.
+
+    Returns
+    -------
+    str
+        Hash SHA-256 (hexadécimal) du contenu.
+    """
+    blob_hash = hashlib.sha256(data).hexdigest()
+    path = blob_path(blob_hash)
+    if os.path.exists(path):
+        return blob_hash
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    # Écriture dans un fichier temporaire puis renommage : jamais de fichier à moitié écrit
+    fd, tmp_path = tempfile.mkstemp(dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return blob_hash
+
+def get_blob_path(blob_hash):
+    """
+    Chemin d'un fichier existant du store.
+
+    Parameters
+    ----------
+    blob_hash : str
+        Hash du contenu.
+
+    Raises
+    ------
+    BlobNotFound
+        Si aucun fichier ne correspond.
+
+    Returns
+    -------
+    str
+        Chemin du fichier.
+    """
+    path = blob_path(blob_hash)
+    if not os.path.exists(path):
+        raise BlobNotFound(f"Fichier ({blob_hash}) introuvable!")
+    return path
+
+
+if __name__ == "__main__":
+    # Migration : python db_blob_utils.py
+    # Sort les photos de profil (base64) de database_auth.json vers le store
+    import db_auth_utils
+    nb = db_auth_utils.migrate_profile_pictures()
+    print(f"{nb} photo(s) de profil migrée(s) vers {BLOB_DIR}")
@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl  # Linux / macOS
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt  # Windows
+except ImportError:
+    msvcrt = None
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Verrou partagé (lecture) / exclusif (écriture) si les lectures deviennent un problème
+
+#------------ Variables globales ------------#
+_LOCKS = {}  # chemin absolu -> FileLock (un seul verrou par fichier et par process)
+_LOCKS_GUARD = threading.Lock()
+
+
+#------------ Classes Exception ------------#
+class CorruptDatabaseError(Exception):
+    """Levée quand un fichier de DB existe mais ne contient pas du JSON valide"""
+    pass
+
+
+#------------ Verrou inter-process ------------#
+class FileLock:
+    """
+    Verrou exclusif sur un fichier, partagé entre les threads et entre les
+    process (plusieurs workers gunicorn).
+
+    - Entre process : flock (fcntl) sur DB_FILE + ".lock", ou msvcrt.locking
+      sous Windows. Le verrou est relâché par le système si le process meurt.
+    - Entre threads : un RLock, car flock ne protège pas deux threads du même
+      process.
+    - Réentrant : un thread qui a déjà le verrou peut le reprendre (ex : add
+      appelé pendant une transaction), seul le dernier release le libère.
+
+    S'utilise avec "with".
+    """
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        """Attend d'avoir le verrou."""
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+b")
+                self._lock_file()
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        """Libère le verrou (pour de vrai au dernier release)."""
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                self._unlock_file()
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def _lock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK abandonne au bout de 10 s : on réessaie
+        # Sinon (plateforme inconnue) : seulement le verrou entre threads
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+#------------ Fonctions publiques ------------#
+def file_lock(path):
+    """
+    Verrou associé à un fichier de DB. Toujours le même objet pour un même
+    fichier, pour que la réentrance marche même si le store a été recréé.
+
+    Parameters
+    ----------
+    path : str
+        Chemin du fichier protégé.
+
+    Returns
+    -------
+    FileLock
+        Le verrou.
+    """
+    key = os.path.abspath(path)
+    with _LOCKS_GUARD:
+        if key not in _LOCKS:
+            _LOCKS[key] = FileLock(path)
+        return _LOCKS[key]
+
+def read_json(path, empty):
+    """
+    Lit un fichier JSON.
+
+    Parameters
+    ----------
+    path : str
+        Chemin du fichier.
+    empty : dict
+        Contenu à retourner si le fichier n'existe pas ou est vide.
+
+    Raises
+    ------
+    CorruptDatabaseError
+        Si le fichier n'est pas du JSON valide (ex : écrit à moitié). On
+        préfère une erreur à une DB vide qui écraserait les données au
+        prochain save.
+
+    Returns
+    -------
+    dict
+        Contenu du fichier.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+    except FileNotFoundError:
+        return empty
+    if not content:  # fichier vide (tout juste créé)
+        return empty
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        raise CorruptDatabaseError(f"Fichier {path} corrompu : {e}") from e
+
+def write_json(path, data, default=None):
+    """
+    Écrit un fichier JSON de façon atomique : fichier temporaire dans le même
+    dossier, fsync, puis renommage. Après un crash on a soit l'ancien
+    fichier, soit le nouveau, jamais un fichier à moitié écrit.
+
+    Parameters
+    ----------
+    path : str
+        Chemin du fichier.
+    data : dict
+        Contenu à écrire.
+    default : callable, optional
+        Passé à json.dump pour les types non JSON (ex : sets).
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(folder)
+
+def fsync_dir(folder):
+    """Force l'écriture du dossier (le renommage) sur le disque. Sans effet sous Windows."""
+    if os.name != "posix":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
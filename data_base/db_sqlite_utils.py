@@ -0,0 +1,404 @@
+import json
+import sqlite3
+import db_file_utils
+import db_auth_utils  # avant db_tweet_utils (import circulaire)
+import db_tweet_utils
+from db_auth_utils import UserStore, _normalize_email
+from db_tweet_utils import TweetStore, _date_key, _json_default, _normalize_author, _op_uid
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Servir certaines lectures directement en SQL (profil d'un user...) plutôt que depuis le cache
+    # Passer par sqlalchemy si on veut un jour changer de SGBD
+
+#------------ Variables globales ------------#
+SQLITE_FILE = "./tweetinsa.db"  #chemin de la DB SQLite (tweets et users dans le même fichier)
+
+# Un tweet / une réponse / un user = une ligne avec les colonnes indexées + le reste en JSON (doc).
+# Les likes et retweets sont des tables d'arêtes (tweet_id, uid).
+# SQLite ne sert qu'à la persistance : toutes les lectures passent par le cache en mémoire,
+# relu depuis ces tables quand un autre worker les a modifiées.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    tweet_id TEXT PRIMARY KEY,
+    uid      TEXT,
+    date     TEXT,
+    doc      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tweets_uid ON tweets(uid);
+CREATE INDEX IF NOT EXISTS tweets_date ON tweets(date, tweet_id);
+
+CREATE TABLE IF NOT EXISTS replies (
+    reply_id TEXT PRIMARY KEY,
+    tweet_id TEXT NOT NULL,
+    uid      TEXT,
+    date     TEXT,
+    doc      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replies_tweet ON replies(tweet_id, date, reply_id);
+
+CREATE TABLE IF NOT EXISTS likes (
+    tweet_id TEXT NOT NULL,
+    uid      TEXT NOT NULL,
+    PRIMARY KEY (tweet_id, uid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS likes_uid ON likes(uid);
+
+CREATE TABLE IF NOT EXISTS retweets (
+    tweet_id TEXT NOT NULL,
+    uid      TEXT NOT NULL,
+    PRIMARY KEY (tweet_id, uid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS retweets_uid ON retweets(uid);
+
+CREATE TABLE IF NOT EXISTS users (
+    uid      TEXT PRIMARY KEY,
+    username TEXT,
+    email    TEXT,
+    doc      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_username ON users(username);
+CREATE INDEX IF NOT EXISTS users_email ON users(email);
+
+DROP TABLE IF EXISTS follows;
+
+CREATE TABLE IF NOT EXISTS ops (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_ENGAGEMENTS = ("likes", "retweets")  # champs du tweet rangés dans leur propre table
+
+
+#------------ Fonctions internes ------------#
+def connect(path):
+    """
+    Ouvre la DB SQLite (mode WAL : les lectures ne bloquent pas les écritures)
+    et crée les tables si besoin.
+
+    Parameters
+    ----------
+    path : str
+        Chemin du fichier SQLite.
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connexion en autocommit : les transactions sont ouvertes à la main.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def _meta(conn, key):
+    """Valeur d'un compteur de la table meta (0 s'il n'existe pas)."""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+def _data_version(conn):
+    """Change quand une autre connexion (autre worker...) a écrit dans la DB."""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+#------------ Stores ------------#
+class SQLiteTweetStore(TweetStore):
+    """
+    Même cache en mémoire que TweetStore, mais sauvegardé dans SQLite au lieu
+    du snapshot JSON + journal.
+
+    - Chaque opération met à jour les tables (ligne du tweet, réponses,
+      likes, retweets) et est ajoutée à la table ops, l'équivalent du journal :
+      les autres workers rejouent les opérations qu'ils n'ont pas vues.
+    - La compaction vide juste la table ops (les tables sont toujours à jour).
+    - Une réécriture complète (save(db)) ajoute une opération "reset" qui
+      force les autres workers à tout relire.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file_lock = db_file_utils.file_lock(path + ".tweets")
+        self._conn = connect(path)
+        self._seq = 0        # dernière opération de la table ops appliquée
+        self._version = None  # data_version lors de la dernière lecture
+
+    def _snapshot_changed(self):
+        return False  # une réécriture complète passe par l'opération "reset"
+
+    def _log_changed(self):
+        return _data_version(self._conn) != self._version
+
+    def _read_file(self):
+        """
+        Lit tous les tweets (avec leurs likes et retweets) et les réponses
+        dans une même transaction.
+        """
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            self._version = _data_version(conn)
+            tweets = {}
+            for tweet_id, doc in conn.execute("SELECT tweet_id, doc FROM tweets ORDER BY rowid"):
+                tweets[tweet_id] = json.loads(doc)
+            threads = {}
+            for tweet_id, doc in conn.execute("SELECT tweet_id, doc FROM replies ORDER BY tweet_id, date, reply_id"):
+                threads.setdefault(tweet_id, []).append(json.loads(doc))
+            for field in _ENGAGEMENTS:
+                for tweet_id, uid in conn.execute(f"SELECT tweet_id, uid FROM {field}"):
+                    if tweet_id in tweets:
+                        tweets[tweet_id].setdefault(field, set()).add(uid)
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ops").fetchone()[0]
+            self._seq = max(self._seq, _meta(conn, "tweets_trimmed"))
+        finally:
+            conn.execute("COMMIT")
+        legacy = [t for t in tweets.values() if "replies" in t]
+        if legacy:
+            self._move_replies(legacy)
+        return {"tweets": list(tweets.values()), "replies": threads}
+
+    def _move_replies(self, tweets):
+        """
+        Range dans la table replies les réponses des tweets écrits avant elle
+        (stockées dans le doc du tweet). Le reste du tweet ne change pas.
+        """
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for tweet in tweets:
+                for reply in tweet.get("replies") or []:
+                    self._write_reply(tweet["tweet_id"], _normalize_author(dict(reply)))
+                doc = {k: v for k, v in tweet.items() if k not in _ENGAGEMENTS and k != "replies"}
+                conn.execute("UPDATE tweets SET doc = ? WHERE tweet_id = ?",
+                             (json.dumps(doc, default=_json_default), tweet["tweet_id"]))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._version = _data_version(conn)
+
+    def _replay_log(self):
+        """Rejoue les opérations écrites par les autres workers depuis la dernière lecture."""
+        conn = self._conn
+        version = _data_version(conn)
+        if self._seq < _meta(conn, "tweets_trimmed"):
+            self._reload()  # opérations déjà effacées par une compaction
+            return
+        rows = conn.execute("SELECT seq, op FROM ops WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+        for seq, line in rows:
+            op = json.loads(line)
+            if op["op"] == "reset":
+                self._reload()
+                return
+            self._apply(op)
+            self._log_ops += 1
+            self._seq = seq
+        self._version = version
+
+    def _write_tweet(self, tweet):
+        """Écrit la ligne d'un tweet et ses likes / retweets."""
+        doc = {k: v for k, v in tweet.items() if k not in _ENGAGEMENTS and k != "retweet_count"}
+        self._conn.execute("INSERT OR REPLACE INTO tweets(tweet_id, uid, date, doc) VALUES (?, ?, ?, ?)",
+                           (tweet["tweet_id"], tweet.get("uid"), _date_key(tweet.get("date")),
+                            json.dumps(doc, default=_json_default)))
+        for field in _ENGAGEMENTS:
+            self._conn.executemany(f"INSERT OR IGNORE INTO {field}(tweet_id, uid) VALUES (?, ?)",
+                                   [(tweet["tweet_id"], u) for u in tweet.get(field, ())])
+
+    def _write_reply(self, tweet_id, reply):
+        """Écrit la ligne d'une réponse."""
+        self._conn.execute("INSERT OR REPLACE INTO replies(reply_id, tweet_id, uid, date, doc) VALUES (?, ?, ?, ?, ?)",
+                           (reply["reply_id"], tweet_id, reply.get("uid"), _date_key(reply.get("date")),
+                            json.dumps(reply, default=_json_default)))
+
+    def _write_op(self, op):
+        """Traduit une opération (déjà appliquée en mémoire) en requêtes SQL."""
+        kind = op["op"]
+        if kind == "post":
+            self._write_tweet(self._by_id.get(op["tweet"]["tweet_id"], op["tweet"]))
+        elif kind == "delete":
+            for table in ("tweets", "replies") + _ENGAGEMENTS:
+                self._conn.execute(f"DELETE FROM {table} WHERE tweet_id = ?", (op["tweet_id"],))
+        elif kind in ("like", "retweet"):
+            self._conn.execute(f"INSERT OR IGNORE INTO {kind}s(tweet_id, uid) VALUES (?, ?)",
+                               (op["tweet_id"], _op_uid(op)))
+        elif kind in ("unlike", "unretweet"):
+            self._conn.execute(f"DELETE FROM {kind[2:]}s WHERE tweet_id = ? AND uid = ?",
+                               (op["tweet_id"], _op_uid(op)))
+        elif kind == "reply":
+            self._write_reply(op["tweet_id"], _normalize_author(dict(op["reply"])))
+        elif kind == "unreply":
+            self._conn.execute("DELETE FROM replies WHERE reply_id = ?", (op["reply_id"],))
+        else:
+            # report, media... : on réécrit la ligne du tweet
+            tweet = self._by_id.get(op.get("tweet_id"))
+            if tweet is not None:
+                self._write_tweet(tweet)
+
+    def _append(self, lines):
+        """Applique les opérations aux tables et les ajoute à ops, en une transaction."""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for line in lines:
+                self._write_op(json.loads(line))
+                self._seq = conn.execute("INSERT INTO ops(op) VALUES (?)", (line,)).lastrowid
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._log_ops += len(lines)
+        self._version = _data_version(conn)
+
+    def compact(self):
+        """Vide la table ops (les tables contiennent déjà tout)."""
+        with self.transaction():
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM ops WHERE seq <= ?", (self._seq,))
+            _set_meta(conn, "tweets_trimmed", self._seq)
+            conn.execute("COMMIT")
+            self._log_ops = 0
+            self._version = _data_version(conn)
+
+    def _write_snapshot(self):
+        """Réécrit toutes les tables tweets et prévient les autres workers."""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("tweets", "replies") + _ENGAGEMENTS:
+                conn.execute(f"DELETE FROM {table}")
+            for tweet in self._db.get("tweets", []):
+                self._write_tweet(tweet)
+            for tweet_id, thread in self._db.get("replies", {}).items():
+                for reply in thread:
+                    self._write_reply(tweet_id, reply)
+            conn.execute("DELETE FROM ops")
+            self._seq = conn.execute("INSERT INTO ops(op) VALUES (?)", (json.dumps({"op": "reset"}),)).lastrowid
+            _set_meta(conn, "tweets_trimmed", self._seq - 1)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._pending = []
+        self._log_ops = 0
+        self._version = _data_version(conn)
+
+    def save(self, db=None):
+        super().save(self.data() if db is None else db)
+
+    def invalidate(self):
+        super().invalidate()
+        self._seq = 0
+        self._version = None
+
+
+class SQLiteUserStore(UserStore):
+    """
+    Même cache en mémoire que UserStore, mais sauvegardé dans SQLite :
+    une ligne par user (clé : uid, username et email indexés). Les
+    abonnements restent dans le doc du user, seul endroit où ils sont lus.
+
+    Une sauvegarde n'écrit que les users qui ont changé depuis la
+    précédente, au lieu de réécrire tout le fichier.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = db_file_utils.file_lock(path + ".users")
+        self._conn = connect(path)
+        self._saved = {}  # uid -> doc JSON tel qu'il est dans la DB
+        self._data_version = None
+        self._users_version = None
+
+    def _file_stamp(self):
+        """Compteur de modifications des users (relu seulement si la DB a changé)."""
+        version = _data_version(self._conn)
+        if version != self._data_version:
+            self._data_version = version
+            self._users_version = _meta(self._conn, "users_version")
+        return self._users_version
+
+    def _read_file(self):
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute("SELECT uid, doc FROM users ORDER BY rowid").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        self._saved = dict(rows)
+        return {"users": [json.loads(doc) for _, doc in rows]}
+
+    def _write(self):
+        """Écrit les users ajoutés, modifiés ou supprimés depuis la dernière sauvegarde."""
+        docs = {}
+        for u in self._db.get("users", []):
+            docs.setdefault(u["uid"], (u, json.dumps(u)))
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for uid in self._saved.keys() - docs.keys():
+                conn.execute("DELETE FROM users WHERE uid = ?", (uid,))
+            for uid, (u, doc) in docs.items():
+                if self._saved.get(uid) == doc:
+                    continue
+                conn.execute("INSERT OR REPLACE INTO users(uid, username, email, doc) VALUES (?, ?, ?, ?)",
+                             (uid, u["username"], _normalize_email(u.get("email")), doc))
+            self._users_version = _meta(conn, "users_version") + 1
+            _set_meta(conn, "users_version", self._users_version)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._saved = {uid: doc for uid, (_, doc) in docs.items()}
+        self._data_version = _data_version(conn)
+        self._stamp = self._users_version
+
+    def invalidate(self):
+        super().invalidate()
+        self._saved = {}
+        self._data_version = None
+        self._users_version = None
+
+
+#------------ Fonctions publiques ------------#
+def migrate_from_json(tweets_file=None, users_file=None, sqlite_file=None):
+    """
+    Copie les DB JSON (snapshot + journal des tweets, users) dans SQLite.
+    Les tables SQLite sont entièrement remplacées.
+
+    Parameters
+    ----------
+    tweets_file, users_file : str, optional
+        Fichiers JSON. Par défaut db_tweet_utils.DB_FILE et db_auth_utils.DB_FILE.
+    sqlite_file : str, optional
+        Fichier SQLite. Par défaut SQLITE_FILE.
+
+    Returns
+    -------
+    tuple of int
+        (nb de tweets, nb de users) copiés.
+    """
+    tweets_db = TweetStore(tweets_file or db_tweet_utils.DB_FILE).data()
+    users_db = UserStore(users_file or db_auth_utils.DB_FILE).data()
+    sqlite_file = sqlite_file or SQLITE_FILE
+    SQLiteTweetStore(sqlite_file).save(tweets_db)
+    SQLiteUserStore(sqlite_file).save(users_db)
+    return len(tweets_db["tweets"]), len(users_db["users"])
+
+
+if __name__ == "__main__":
+    # Migration : python db_sqlite_utils.py [DB_Tweets.json database_auth.json tweetinsa.db]
+    # Puis lancer l'appli avec TWEETINSA_BACKEND=sqlite
+    import sys
+    nb_tweets, nb_users = migrate_from_json(*sys.argv[1:4])
+    print(f"{nb_tweets} tweet(s) et {nb_users} utilisateur(s) copiés dans {sys.argv[3] if len(sys.argv) > 3 else SQLITE_FILE}")
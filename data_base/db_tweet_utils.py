@@ -1,9 +1,17 @@
 import json
 import os
+import re
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+import heapq
 import random
+import threading
+import atexit
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 import db_auth_utils
+import db_file_utils
+from db_file_utils import CorruptDatabaseError
 
 
 
@@ -14,7 +22,18 @@ import db_auth_utils
 
 #------------ Variables globales ------------#
 DB_FILE = "./DB_Tweets.json"  #chemin de la DB
+BACKEND = os.environ.get("TWEETINSA_BACKEND", "json")  #"json" (DB_FILE) ou "sqlite" (db_sqlite_utils.SQLITE_FILE)
+LOG_COMPACT_EVERY = 500  #nb d'opérations dans le journal avant de réécrire DB_FILE
+FLUSH_INTERVAL_MS = int(os.environ.get("TWEETS_FLUSH_INTERVAL_MS", 0))  #fenêtre de durabilité : les écritures sont regroupées pendant ce temps max (0 = écriture immédiate)
+FLUSH_MAX_OPS = 100  #en mode regroupé, on écrit dès que ce nb d'opérations est en attente
+REPLIES_PREVIEW = 2  #nb de réponses affichées sous un tweet dans la timeline (les autres à la demande)
+REPLIES_PAGE_SIZE = 20  #nb de réponses par page de /tweet/<id>/replies
+INBOX_SIZE = 800  #nb max de tweets gardés dans le fil d'abonnements d'un user
+FANOUT_MAX_FOLLOWERS = 1000  #au-delà, les tweets d'un compte sont lus à la demande (pas de fan-out)
+SAMPLE_MAX_TRIES = 10  #tirage au sort : nb max de tirages par tweet demandé (tweets déjà tirés ou filtrés)
 #DB_AUTH = "./data_base/database_auth.json"
+_HASHTAG_RE = re.compile(r"#(\w+)")
+_MENTION_RE = re.compile(r"@(\w+)")
 
 
 
@@ -27,12 +46,835 @@ class TweetNotFound(Exception):
     """Levée quand tweet non trouvé"""
     pass
 
+class AlreadyReported(Exception):
+    """Levée quand un utilisateur signale deux fois le même tweet"""
+    pass
+
+
+#------------ Cache en mémoire ------------#
+class TweetStore:
+    """
+    Garde la DB des tweets en mémoire pour éviter de relire et reparser
+    le fichier JSON à chaque appel.
+
+    - Le fichier n'est lu qu'au premier accès.
+    - Les lectures sont servies depuis la mémoire.
+    - Chaque modification (post, delete, like, unlike, retweet, reply,
+      unreply, report, media) est une "opération" ajoutée en fin de journal (DB_FILE + ".log",
+      une ligne JSON par opération) : une écriture coûte un petit append au
+      lieu de réécrire tout le fichier.
+    - Au chargement, on lit le snapshot (DB_FILE) puis on rejoue le journal.
+      Quand le journal devient trop long, on réécrit le snapshot et on vide
+      le journal (compaction).
+    - Si un des fichiers a été modifié par quelqu'un d'autre (autre process,
+      édition à la main...), on s'en rend compte grâce à sa date de
+      modification et à sa taille : on relit le snapshot, ou seulement la
+      fin du journal s'il a juste grandi.
+    - Un index tweet_id -> tweet permet de trouver un tweet en O(1).
+    - Un index trié par date permet de servir une page de la timeline sans
+      trier tous les tweets (coût proportionnel à la taille de la page).
+    - Les réponses ne sont pas dans leur tweet mais dans db["replies"]
+      (tweet_id -> réponses triées par date) : afficher un tweet ne lit que
+      les réponses affichées, le reste est paginé (voir get_replies).
+    - En mémoire, "likes", "retweets" et "reporters" sont des sets (listes
+      dans le fichier) : liker, annuler et "a-t-il liké ?" coûtent O(1) même
+      sur un tweet très liké. "retweet_count" et "reports" sont toujours
+      recalculés à partir du set, ils ne peuvent plus se désynchroniser.
+    - Les auteurs (tweets et réponses), likes, retweets et signalements
+      sont des uid (voir db_auth_utils.UserStore), pas des usernames : un
+      renommage ne touche aucun tweet. Les tweets d'avant les uid ("username")
+      sont convertis au chargement, leur ancien username servant d'uid.
+
+    Toutes les opérations sont idempotentes (liker deux fois = liker une
+    fois...), on peut donc rejouer une ligne du journal sans risque.
+
+    Plusieurs workers peuvent partager les fichiers : chaque écriture se fait
+    dans une transaction (verrou inter-process, puis relecture de ce que les
+    autres ont écrit), et le snapshot est réécrit de façon atomique
+    (fichier temporaire + fsync + renommage). Les lectures ne prennent pas le
+    verrou : elles voient toujours un snapshot complet, et une ligne de
+    journal incomplète est ignorée.
+
+    Chaque opération appliquée (y compris celles rejouées depuis le journal
+    d'un autre process) est signalée aux fonctions enregistrées avec
+    add_listener, pour que les index dérivés restent à jour.
+
+    Écritures regroupées (si FLUSH_INTERVAL_MS > 0) : une opération est
+    appliquée en mémoire tout de suite, mais n'est écrite dans le journal
+    qu'au bout de FLUSH_INTERVAL_MS, ou dès que FLUSH_MAX_OPS opérations
+    attendent, ou à l'arrêt du process. Toutes les opérations en attente
+    partent en un seul write + fsync. En cas de crash, on perd au plus la
+    fenêtre de FLUSH_INTERVAL_MS ; les autres workers voient les
+    modifications avec le même délai. Les opérations décidées d'après
+    l'état lu (like / unlike, retweet, signalement, numéro d'ordre d'une
+    réponse) sont écrites tout de suite (apply(op, sync=True)) : un autre
+    worker décide toujours sur un état à jour.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.log_path = path + ".log"
+        self._db = None
+        self._stamp = None       # empreinte du snapshot
+        self._log_stamp = None   # empreinte du journal
+        self._log_offset = 0     # nb d'octets du journal déjà rejoués
+        self._log_ops = 0        # nb d'opérations dans le journal
+        self._by_id = {}  # index tweet_id -> tweet (mêmes objets que dans la liste)
+        self._lock = threading.RLock()  # requêtes Flask et threads d'arrière-plan (médias)
+        self._file_lock = db_file_utils.file_lock(path)  # entre workers, pour les écritures
+        self._by_date = []  # liste triée de (clé de date, tweet_id), du plus ancien au plus récent
+        self._ids = []  # tweet_ids dans l'ordre de db["tweets"] (quelconque), pour le tirage au sort
+        self._id_pos = {}  # tweet_id -> position dans _ids et db["tweets"] (retrait en O(1))
+        self._by_author = {}  # uid -> liste triée de (clé de date, tweet_id) de ses tweets
+        self._reply_seq = 0  # plus grand numéro d'ordre ("seq") des réponses connues
+        self._pending = []  # lignes JSON des opérations appliquées en mémoire mais pas encore écrites
+        self._flush_timer = None
+
+    @staticmethod
+    def _file_stamp(path):
+        """
+        Empreinte d'un fichier sur le disque : (mtime, taille, inode).
+        None si le fichier n'existe pas.
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _read_file(self):
+        """
+        Lit le snapshot JSON.
+        Si le fichier n'existe pas ou est vide, retourne {"tweets": [], "replies": {}}.
+        S'il est corrompu, lève CorruptDatabaseError.
+        """
+        return db_file_utils.read_json(self.path, {"tweets": [], "replies": {}})
+
+    def is_stale(self):
+        """
+        Returns
+        -------
+        bool
+            True si le cache n'est pas chargé ou si un des fichiers a changé depuis.
+        """
+        return self._db is None or self._snapshot_changed() or self._log_changed()
+
+    def _snapshot_changed(self):
+        """True si le snapshot a été réécrit depuis le dernier chargement."""
+        return self._file_stamp(self.path) != self._stamp
+
+    def _log_changed(self):
+        """True si le journal a changé depuis la dernière lecture."""
+        return self._file_stamp(self.log_path) != self._log_stamp
+
+    def data(self):
+        """
+        Donne la DB des tweets, rechargée seulement si les fichiers ont changé.
+
+        Returns
+        -------
+        dict
+            Database des tweets (l'objet en mémoire, pas une copie).
+        """
+        with self._lock:
+            if self._db is None or self._snapshot_changed():
+                self._reload()
+            elif self._log_changed():
+                self._replay_log()
+            return self._db
+
+    def _reload(self):
+        """Relit le snapshot puis rejoue tout le journal."""
+        self._stamp = self._file_stamp(self.path)
+        self._db = self._read_file()
+        self._db.setdefault("tweets", [])
+        self._reindex()
+        self._log_stamp = None
+        self._log_offset = 0
+        self._log_ops = 0
+        self._replay_log()
+        # Nos opérations pas encore écrites ne sont pas dans les fichiers
+        for line in self._pending:
+            self._apply(json.loads(line))
+
+    def _replay_log(self):
+        """
+        Rejoue les opérations du journal qui n'ont pas encore été appliquées.
+        Une dernière ligne incomplète (écriture en cours ou crash) est ignorée.
+        """
+        stamp = self._file_stamp(self.log_path)
+        if stamp is None:
+            # Journal supprimé (compaction par un autre process) : le prochain repart de zéro
+            self._log_stamp = None
+            self._log_offset = 0
+            self._log_ops = 0
+            return
+        if (stamp[1] < self._log_offset
+                or (self._log_stamp is None and self._log_offset > 0)
+                or (self._log_stamp is not None and stamp[2] != self._log_stamp[2])):
+            # Journal tronqué ou remplacé (compaction par un autre process)
+            self._reload()
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n")
+        if end >= 0:
+            for line in chunk[:end + 1].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # ligne abîmée par un crash
+                self._apply(op)
+                self._log_ops += 1
+            self._log_offset += end + 1
+        self._log_stamp = stamp
+
+    def _reindex(self):
+        """
+        Reconstruit les index (tweet_id et date) à partir de la liste.
+        Les réponses des anciennes DB (rangées dans leur tweet) sont déplacées
+        dans db["replies"] ; elles y seront écrites à la prochaine compaction.
+        """
+        threads = self._db.setdefault("replies", {})
+        for t in self._db.get("tweets", []):
+            _normalize_tweet(t)
+            nested = t.pop("replies", None)
+            if nested:
+                thread = threads.setdefault(t["tweet_id"], [])
+                known = {r["reply_id"] for r in thread}
+                thread.extend(r for r in nested if r["reply_id"] not in known)
+        for thread in threads.values():
+            for r in thread:
+                _normalize_author(r)
+            thread.sort(key=_reply_key)
+        self._reply_seq = max((r.get("seq", 0) for thread in threads.values() for r in thread), default=0)
+        self._by_id = {t["tweet_id"]: t for t in self._db.get("tweets", [])}
+        self._db["tweets"] = list(self._by_id.values())  # sans doublons : même ordre que _ids
+        self._by_date = sorted((_date_key(t.get("date")), t["tweet_id"]) for t in self._by_id.values())
+        self._ids = list(self._by_id)
+        self._id_pos = {tweet_id: i for i, tweet_id in enumerate(self._ids)}
+        self._by_author = {}
+        for entry in self._by_date:
+            self._by_author.setdefault(self._by_id[entry[1]].get("uid"), []).append(entry)
+        _notify("reset", None)
+
+    def _unindex_author(self, tweet):
+        """Retire un tweet de l'index par auteur."""
+        entries = self._by_author.get(tweet.get("uid"), [])
+        entry = (_date_key(tweet.get("date")), tweet["tweet_id"])
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+            if not entries:
+                del self._by_author[tweet.get("uid")]
+
+    def _apply(self, op):
+        """
+        Applique une opération sur la DB en mémoire (sans rien écrire).
+
+        Parameters
+        ----------
+        op : dict
+            Opération, ex : {"op": "like", "tweet_id": ..., "uid": ...}.
+        """
+        kind = op["op"]
+        if kind == "post":
+            tweet = op["tweet"]
+            if tweet["tweet_id"] in self._by_id:
+                return  # déjà appliqué
+            _normalize_tweet(tweet)
+            self._db["tweets"].append(tweet)
+            self._by_id[tweet["tweet_id"]] = tweet
+            insort(self._by_date, (_date_key(tweet.get("date")), tweet["tweet_id"]))
+            self._id_pos[tweet["tweet_id"]] = len(self._ids)
+            self._ids.append(tweet["tweet_id"])
+            insort(self._by_author.setdefault(tweet.get("uid"), []), (_date_key(tweet.get("date")), tweet["tweet_id"]))
+            _notify(kind, tweet, op)
+            return
+
+        tweet = self._by_id.get(op["tweet_id"])
+        if tweet is None:
+            return  # tweet supprimé entre temps
+
+        if kind == "delete":
+            # Les réponses partent avec le tweet : les listeners les voient partir une à une
+            for r in self._db["replies"].pop(op["tweet_id"], []):
+                _notify("unreply", tweet, {"op": "unreply", "tweet_id": op["tweet_id"],
+                                           "reply_id": r["reply_id"], "uid": r.get("uid")})
+            del self._by_id[op["tweet_id"]]
+            entry = (_date_key(tweet.get("date")), op["tweet_id"])
+            i = bisect_left(self._by_date, entry)
+            if i < len(self._by_date) and self._by_date[i] == entry:
+                del self._by_date[i]
+            self._unindex_author(tweet)
+            # Le dernier tweet prend la place du tweet supprimé (dans _ids et db["tweets"])
+            pos = self._id_pos.pop(op["tweet_id"])
+            last = self._ids.pop()
+            last_tweet = self._db["tweets"].pop()
+            if pos < len(self._ids):
+                self._ids[pos] = last
+                self._db["tweets"][pos] = last_tweet
+                self._id_pos[last] = pos
+        elif kind == "like":
+            tweet.setdefault("likes", set()).add(_op_uid(op))
+        elif kind == "unlike":
+            tweet.get("likes", set()).discard(_op_uid(op))
+        elif kind == "retweet":
+            retweets = tweet.setdefault("retweets", set())
+            retweets.add(_op_uid(op))
+            tweet["retweet_count"] = len(retweets)
+        elif kind == "unretweet":
+            retweets = tweet.get("retweets", set())
+            retweets.discard(_op_uid(op))
+            tweet["retweet_count"] = len(retweets)
+        elif kind == "reply":
+            thread = self._db["replies"].setdefault(op["tweet_id"], [])
+            if any(r["reply_id"] == op["reply"]["reply_id"] for r in thread):
+                return  # déjà appliquée (les listeners ajoutent la réponse une seule fois)
+            insort(thread, _normalize_author(op["reply"]), key=_reply_key)
+            self._reply_seq = max(self._reply_seq, op["reply"].get("seq", 0))
+        elif kind == "unreply":
+            thread = [r for r in self._db["replies"].get(op["tweet_id"], []) if r["reply_id"] != op["reply_id"]]
+            if thread:
+                self._db["replies"][op["tweet_id"]] = thread
+            else:
+                self._db["replies"].pop(op["tweet_id"], None)
+        elif kind == "media":
+            tweet["media_variants"] = op["variants"]
+        elif kind == "report":
+            reporters = tweet.setdefault("reporters", set())
+            if _op_uid(op) not in reporters:
+                reporters.add(_op_uid(op))
+                tweet["reports"] = len(reporters)
+                if op.get("date"):  # les anciens journaux n'ont pas la date
+                    tweet.setdefault("first_report", op["date"])
+                    tweet["last_report"] = op["date"]
+        _notify(kind, tweet, op)
+
+    def _append(self, lines):
+        """
+        Ajoute des opérations à la fin du journal (un seul write et un seul fsync).
+
+        Parameters
+        ----------
+        lines : list of str
+            Opérations déjà appliquées en mémoire, en JSON.
+        """
+        line = "".join(l + "\n" for l in lines).encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            start = f.tell()
+            if start > 0:
+                # Si un crash a laissé une ligne incomplète, on repart sur une ligne propre
+                with open(self.log_path, "rb") as r:
+                    r.seek(start - 1)
+                    if r.read(1) != b"\n":
+                        line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        self._log_ops += len(lines)
+        if start == self._log_offset:
+            # Personne d'autre n'a écrit entre temps : on est à jour
+            self._log_offset = end
+            self._log_stamp = self._file_stamp(self.log_path)
+        # Sinon, la prochaine lecture rejouera aussi les lignes des autres (idempotent)
+
+    def apply(self, op, sync=False):
+        """
+        Applique une opération en mémoire et l'écrit dans le journal, tout de
+        suite ou avec les suivantes (voir FLUSH_INTERVAL_MS).
+        Compacte le journal s'il dépasse LOG_COMPACT_EVERY opérations.
+
+        Parameters
+        ----------
+        op : dict
+            Opération (voir _apply).
+        sync : bool, optional
+            Écrire tout de suite (avec celles en attente), même en mode
+            regroupé. Pour les opérations choisies d'après l'état lu dans
+            une transaction (toggle...) : le verrou n'est rendu qu'une fois
+            l'opération visible des autres workers.
+        """
+        with self.transaction():
+            # Sérialisée tout de suite : le tweet peut encore changer avant l'écriture
+            self._pending.append(json.dumps(op, default=_json_default))
+            self._apply(op)
+            if sync or FLUSH_INTERVAL_MS <= 0 or len(self._pending) >= FLUSH_MAX_OPS:
+                self.flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(FLUSH_INTERVAL_MS / 1000, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """Écrit dans le journal les opérations en attente, puis compacte si besoin."""
+        with self._file_lock, self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            self.data()  # suit une éventuelle compaction faite par un autre worker
+            self._append(self._pending)
+            self._pending = []
+            if self._log_ops >= LOG_COMPACT_EVERY:
+                self.compact()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Prend le verrou (threads et workers) et met le cache à jour avec ce
+        que les autres ont écrit. À utiliser autour de tout cycle
+        lecture-décision-écriture (ex : liker si pas déjà liké).
+        Réentrant.
+
+        Yields
+        ------
+        dict
+            Database des tweets, à jour.
+        """
+        with self._file_lock, self._lock:
+            yield self.data()
+
+    def get(self, tweet_id):
+        """
+        Cherche un tweet par son id, en temps constant.
+
+        Parameters
+        ----------
+        tweet_id : str
+            Id du tweet.
+
+        Returns
+        -------
+        dict
+            Le tweet, None si inconnu.
+        """
+        self.data()
+        return self._by_id.get(tweet_id)
+
+    def get_many(self, tweet_ids):
+        """
+        Cherche plusieurs tweets d'un coup (la DB n'est vérifiée qu'une fois).
+
+        Parameters
+        ----------
+        tweet_ids : iterable of str
+            Ids des tweets.
+
+        Returns
+        -------
+        list of dict
+            Les tweets trouvés, dans l'ordre des ids (les ids inconnus sont ignorés).
+        """
+        self.data()
+        return [t for t in map(self._by_id.get, tweet_ids) if t is not None]
+
+    def replies(self, tweet_id, after=None, limit=None):
+        """
+        Donne une page des réponses d'un tweet, de la plus ancienne à la plus
+        récente (les réponses sont rangées par tweet, déjà triées).
+
+        Parameters
+        ----------
+        tweet_id : str
+            Id du tweet.
+        after : tuple, optional
+            Clé (voir _reply_key) de la dernière réponse de la page
+            précédente. None pour la première page.
+        limit : int, optional
+            Nombre maximum de réponses. None pour toutes.
+
+        Returns
+        -------
+        replies : list of dict
+            Les réponses de la page.
+        last : tuple
+            Clé de la dernière réponse de la page, None s'il n'y en a pas
+            d'autres.
+        """
+        with self._lock:
+            self.data()
+            thread = self._db["replies"].get(tweet_id, [])
+            start = 0 if after is None else bisect_right(thread, tuple(after), key=_reply_key)
+            end = len(thread) if limit is None else start + limit
+            page = thread[start:end]
+        last = _reply_key(page[-1]) if page and end < len(thread) else None
+        return page, last
+
+    def previews(self, tweet_ids, n):
+        """
+        Nombre de réponses et n premières réponses de plusieurs tweets (la DB
+        n'est vérifiée qu'une fois).
+
+        Returns
+        -------
+        dict
+            tweet_id -> (nb de réponses, liste des n premières).
+        """
+        with self._lock:
+            threads = self.data()["replies"]
+            return {tweet_id: (len(threads.get(tweet_id, ())), threads.get(tweet_id, [])[:n])
+                    for tweet_id in tweet_ids}
+
+    def next_reply_seq(self):
+        """
+        Numéro d'ordre de la prochaine réponse. À appeler dans la même
+        transaction que apply(réponse, sync=True) : le numéro est écrit
+        avant qu'un autre worker puisse prendre le suivant.
+        """
+        with self.transaction():
+            return self._reply_seq + 1
+
+    def replies_of(self, tweet_id):
+        """
+        Toutes les réponses d'un tweet, telles qu'en mémoire (sans vérifier
+        les fichiers) : pour les listeners, appelés pendant une mise à jour.
+        """
+        return self._db["replies"].get(tweet_id, []) if self._db is not None else []
+
+    def sample(self, k, since=None, keep=None):
+        """
+        Tire au sort jusqu'à k tweets distincts, sans parcourir la DB : on
+        tire des positions dans le tableau des ids (ou, pour les tweets
+        récents, dans la fin de l'index par date).
+
+        Parameters
+        ----------
+        k : int
+            Nombre de tweets voulus.
+        since : str, optional
+            Clé de date : seuls les tweets postés depuis sont tirés.
+        keep : function, optional
+            Filtre appelé sur chaque tweet tiré ; les tweets refusés sont
+            remplacés par un nouveau tirage (au plus SAMPLE_MAX_TRIES * k).
+
+        Returns
+        -------
+        list of dict
+            Les tweets tirés (moins de k s'il n'y en a pas assez).
+        """
+        with self._lock:
+            self.data()
+            if since is None:
+                start, end = 0, len(self._ids)
+                pick = self._ids.__getitem__
+            else:
+                start, end = bisect_left(self._by_date, (since,)), len(self._by_date)
+                pick = lambda i: self._by_date[i][1]
+            tweets = []
+            seen = set()
+            tries = 0
+            while len(tweets) < k and len(seen) < end - start and tries < SAMPLE_MAX_TRIES * k:
+                tries += 1
+                i = random.randrange(start, end)
+                if i in seen:
+                    continue
+                seen.add(i)
+                tweet = self._by_id[pick(i)]
+                if keep is None or keep(tweet):
+                    tweets.append(tweet)
+            return tweets
+
+    def add(self, tweet):
+        """
+        Ajoute un tweet (opération "post").
+
+        Parameters
+        ----------
+        tweet : dict
+            Tweet à ajouter (doit contenir "tweet_id").
+        """
+        self.apply({"op": "post", "tweet": tweet})
+
+    def remove(self, tweet_id):
+        """
+        Retire un tweet (opération "delete").
+
+        Parameters
+        ----------
+        tweet_id : str
+            Id du tweet à retirer.
+
+        Returns
+        -------
+        dict
+            Le tweet retiré, None si inconnu.
+        """
+        with self.transaction():
+            tweet = self.get(tweet_id)
+            if tweet is None:
+                return None
+            self.apply({"op": "delete", "tweet_id": tweet_id})
+        return tweet
+
+    def page(self, before=None, limit=20, uid=None):
+        """
+        Donne une page de tweets, du plus récent au plus ancien.
+
+        Parameters
+        ----------
+        before : tuple, optional
+            (clé de date, tweet_id) du dernier tweet de la page précédente.
+            None pour la première page.
+        limit : int
+            Nombre maximum de tweets. None pour tous.
+        uid : str, optional
+            Seulement les tweets de cet auteur (index par auteur).
+
+        Returns
+        -------
+        tweets : list of dict
+            Les tweets de la page.
+        last : tuple
+            (clé de date, tweet_id) du dernier tweet de la page,
+            None s'il n'y a pas de tweets plus anciens.
+        """
+        with self._lock:
+            self.data()
+            index = self._by_date if uid is None else self._by_author.get(uid, [])
+            end = len(index) if before is None else bisect_left(index, tuple(before))
+            start = 0 if limit is None else max(0, end - limit)
+            entries = index[start:end][::-1]
+            tweets = [self._by_id[tweet_id] for _, tweet_id in entries]
+        last = entries[-1] if entries and start > 0 else None
+        return tweets, last
+
+    def compact(self):
+        """
+        Réécrit le snapshot avec l'état en mémoire et vide le journal.
+        Si on crashe entre les deux, le journal sera rejoué sur le nouveau
+        snapshot, ce qui ne change rien (opérations idempotentes).
+        """
+        with self.transaction():
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        """Écrit la DB en mémoire dans le snapshot (atomique) et supprime le journal."""
+        db_file_utils.write_json(self.path, self._db, default=_json_default)
+        self._pending = []  # elles sont dans le snapshot
+        self._stamp = self._file_stamp(self.path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._log_stamp = None
+        self._log_offset = 0
+        self._log_ops = 0
+
+    def save(self, db=None):
+        """
+        Réécrit toute la DB sur le disque (snapshot) et vide le journal.
+        À réserver aux modifications en masse (ex : renommage d'un user).
+
+        Parameters
+        ----------
+        db : dict, optional
+            Database à sauver. Par défaut celle en mémoire.
+            Si elle est donnée, l'index est reconstruit car la liste a pu
+            être modifiée directement par l'appelant.
+        """
+        if db is None:
+            self.compact()
+            return
+        with self._file_lock, self._lock:
+            self._db = db
+            self._reindex()
+            self._write_snapshot()
+
+    def invalidate(self):
+        """Oublie le cache : la prochaine lecture relira les fichiers."""
+        self.flush()
+        self._db = None
+        self._stamp = None
+        self._log_stamp = None
+        self._log_offset = 0
+        self._log_ops = 0
+        self._by_id = {}
+        self._by_date = []
+        self._ids = []
+        self._id_pos = {}
+        self._by_author = {}
+        self._reply_seq = 0
+
+
+_STORE = None
+_LISTENERS = []
+
+def add_listener(callback):
+    """
+    Enregistre une fonction appelée à chaque modification de la DB des tweets.
+
+    Parameters
+    ----------
+    callback : function
+        Appelée avec (kind, tweet, op) :
+        - kind : type d'opération ("post", "delete", "like", "reply"...),
+          ou "reset" quand toute la DB vient d'être rechargée (tweet vaut None).
+        - tweet : le tweet concerné.
+        - op : l'opération complète (qui a liké...), None pour "reset".
+    """
+    _LISTENERS.append(callback)
+
+def _notify(kind, tweet, op=None):
+    """Prévient les listeners d'une modification."""
+    for callback in _LISTENERS:
+        callback(kind, tweet, op)
+
+def _store():
+    """
+    Donne le TweetStore associé à DB_FILE (ou le SQLiteTweetStore si
+    BACKEND vaut "sqlite").
+    Si DB_FILE ou BACKEND a changé (ex : tests sur une DB temporaire), on en crée un nouveau.
+
+    Returns
+    -------
+    TweetStore
+        Cache de la DB des tweets.
+    """
+    global _STORE
+    if BACKEND == "sqlite":
+        import db_sqlite_utils
+        store_class, path = db_sqlite_utils.SQLiteTweetStore, db_sqlite_utils.SQLITE_FILE
+    else:
+        store_class, path = TweetStore, DB_FILE
+    if _STORE is None or type(_STORE) is not store_class or _STORE.path != path:
+        if _STORE is not None:
+            _STORE.flush()
+        _STORE = store_class(path)
+    return _STORE
+
+@atexit.register
+def flush_tweets():
+    """
+    Écrit tout de suite les opérations en attente (écritures regroupées).
+    Appelée automatiquement à l'arrêt du process.
+    """
+    if _STORE is not None:
+        _STORE.flush()
+
 
 #------------ Fonctions internes ------------#
+def _normalize_author(item):
+    """
+    Tweet ou réponse d'avant les uid : "username" devient "uid" (l'ancien
+    username sert d'uid, voir db_auth_utils.UserStore). Modifié sur place.
+    """
+    if "uid" not in item and "username" in item:
+        item["uid"] = item.pop("username")
+    return item
+
+def _normalize_tweet(tweet):
+    """
+    Prépare un tweet lu sur le disque : auteur en uid,
+    "likes", "retweets" et "reporters" en sets (ils sont stockés en listes
+    dans le fichier), "retweet_count" et "reports" recalculés.
+
+    Parameters
+    ----------
+    tweet : dict
+        Tweet à convertir (modifié sur place).
+    """
+    _normalize_author(tweet)
+    for key in ("likes", "retweets", "reporters"):
+        if key in tweet and not isinstance(tweet[key], set):
+            tweet[key] = set(tweet[key] or [])
+    if "retweets" in tweet or "retweet_count" in tweet:
+        tweet["retweet_count"] = len(tweet.get("retweets", ()))
+    if "reporters" in tweet or "reports" in tweet:
+        tweet["reports"] = len(tweet.get("reporters", ()))
+
+def _op_uid(op):
+    """uid d'une opération (les journaux d'avant les uid ont "username")."""
+    return op["uid"] if "uid" in op else op["username"]
+
+def _resolve(item, names):
+    """
+    Copie d'un tweet ou d'une réponse avec "username" : le nom actuel de
+    son auteur (DELETED_USERNAME si le compte n'existe plus).
+    names (uid -> username) est partagé entre les tweets d'une même page :
+    chaque auteur n'est cherché qu'une fois.
+    """
+    uid = item.get("uid")
+    if uid not in names:
+        names[uid] = db_auth_utils.get_username(uid)
+    view = dict(item)
+    view["username"] = names[uid]
+    return view
+
+def _viewer_uid(username):
+    """
+    uid d'un lecteur, pour les affichages (a-t-il liké, retweeté...).
+    None pour un nom inconnu : il n'a rien fait. Les écritures passent par
+    db_auth_utils.get_uid, qui refuse un nom inconnu.
+    """
+    user = db_auth_utils.get_user(username)
+    return user["uid"] if user is not None else None
+
+def _reply_key(reply):
+    """
+    Clé de tri d'une réponse : (clé de date, seq, reply_id). Le numéro
+    d'ordre départage les réponses postées dans la même seconde (les
+    anciennes réponses, sans seq, comptent pour 0).
+    """
+    return (_date_key(reply.get("date")), reply.get("seq", 0), reply["reply_id"])
+
+def _json_default(obj):
+    """Pour json.dump : les sets sont écrits comme des listes (triées, pour un fichier stable)."""
+    if isinstance(obj, set):
+        return sorted(obj)
+    raise TypeError(f"{type(obj).__name__} n'est pas sérialisable en JSON")
+
+def _date_key(date):
+    """
+    Clé de tri d'une date de tweet. Les anciens tweets ont des dates au format
+    "07/10/2025 05:20", les nouveaux au format ISO : on ramène tout en ISO.
+
+    Parameters
+    ----------
+    date : str
+        Date du tweet.
+
+    Returns
+    -------
+    str
+        Date au format ISO ("" si illisible, triée comme la plus ancienne).
+    """
+    if not isinstance(date, str):
+        return ""
+    if "/" in date:
+        try:
+            return datetime.strptime(date, "%d/%m/%Y %H:%M").isoformat(timespec="seconds")
+        except ValueError:
+            return ""
+    return date
+
+def tweets_transaction():
+    """
+    Verrou sur la DB des tweets, pour un cycle _load_tweets / modification /
+    _save_tweets sans perdre les écritures des autres workers :
+
+        with tweets_transaction() as db:
+            ...
+            _save_tweets(db)
+
+    Returns
+    -------
+    context manager
+        Donne la database des tweets, à jour.
+    """
+    return _store().transaction()
+
 def _load_tweets():
     """
-    Charge la database contenant les tweets.
-    Si le fichier n'existe pas, est vide ou corrompu, retourne {"tweets": []}.
+    Charge la database contenant les tweets (depuis le cache en mémoire).
+    Si le fichier n'existe pas ou est vide, retourne {"tweets": []}.
+    S'il est corrompu, lève CorruptDatabaseError (plutôt que de l'écraser).
+
+    Attention : c'est l'objet partagé du cache, il ne faut le modifier que
+    si on appelle _save_tweets juste après (dans un tweets_transaction).
 
     Returns
     -------
@@ -40,19 +882,12 @@ def _load_tweets():
         Database des tweets.
 
     """
-    try:
-        with open(DB_FILE, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content:  # fichier vide
-                return {"tweets": []}
-            return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"tweets": []}
+    return _store().data()
     
 def _load_users():
     """
     Charge la database contenant les utilisateurs.
-    Si le fichier n'existe pas, est vide ou corrompu, retourne {"users": []}.
+    Si le fichier n'existe pas ou est vide, retourne {"users": []}.
 
     Returns
     -------
@@ -76,23 +911,26 @@ def _save_tweets(db):
     -------
     None.
     """
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2)
+    _store().save(db)
 
-def _save_users(db):
+def _save_users(db=None):
     """
     Sauvegarde la database.
 
     Parameters
     ----------
-    db : dict
-        Database à sauver.
+    db : dict, optional
+        Database à sauver. Par défaut celle en mémoire, quand on a seulement
+        modifié des champs non indexés d'un user (ex : sa bio).
 
     Returns
     -------
     None.
     """
-    db_auth_utils._save_db(db)
+    if db is None:
+        db_auth_utils._store().save()
+    else:
+        db_auth_utils._save_db(db)
 
 
 
@@ -112,6 +950,8 @@ def post_tweet(username, description,media_path=None):
     ------
     TweetTooLong
         Si le tweet dépasse 140 caractères.
+    UserNotFoundError
+        Si l'utilisateur n'existe pas.
 
     Returns
     -------
@@ -120,31 +960,44 @@ def post_tweet(username, description,media_path=None):
     """
     if len(description) > 140:
         raise TweetTooLong("Tweet trop long!")
-    db = _load_tweets()
+    user = db_auth_utils.get_user(username)
+    if user is None:
+        raise db_auth_utils.UserNotFoundError(f"Utilisateur '{username}' introuvable.")
     tweet_id = str(uuid.uuid4())
+    hashtags, mentions = extract_tags(description)  # une fois pour toutes, à l'écriture
     tweet = {
         "tweet_id": tweet_id,
-        "username": username,
+        "uid": user["uid"],
         "date": datetime.now().isoformat(timespec="seconds"), # strftime("%d/%m/%Y %H:%M") est mieux pour afficher
         "content": description,
-        "media_path": media_path
+        "media_path": media_path,
+        "hashtags": hashtags,
+        "mentions": mentions
     }
-    db["tweets"].append(tweet)
-    _save_tweets(db)
-
-    db_users = _load_users() 
-    for user in db_users["users"]:
-        if user["username"] == username:
-            if "tweets" not in user:
-                user["tweets"] = []
-            user["tweets"].append(tweet_id)
-            _save_users(db_users)
-            return tweet
-            break
-    else:
-        raise db_auth_utils.UserNotFoundError(f"Utilisateur '{username}' introuvable.")
+    _store().add(tweet)  # les tweets d'un user se retrouvent par l'index par auteur : rien à écrire côté users
+    return tweet
+
 
 
+def extract_tags(text):
+    """
+    Extrait les #hashtags et @mentions d'un texte.
+
+    Parameters
+    ----------
+    text : str
+        Contenu du tweet.
+
+    Returns
+    -------
+    hashtags : list of str
+        Hashtags en minuscules, sans le "#", sans doublon, dans l'ordre du texte.
+    mentions : list of str
+        Usernames mentionnés, sans le "@", sans doublon, dans l'ordre du texte.
+    """
+    hashtags = list(dict.fromkeys(tag.lower() for tag in _HASHTAG_RE.findall(text)))
+    mentions = list(dict.fromkeys(_MENTION_RE.findall(text)))
+    return hashtags, mentions
 
 def get_id(tweet):
     """
@@ -179,14 +1032,69 @@ def get_tweet(tweet_id):
     Returns
     -------
     t : dict
-        Tweet crrespondant.
+        Copie du tweet crrespondant, avec le "username" actuel de son auteur
+        et toutes ses réponses dans "replies" (idem, avec le "username").
     """
-    db = _load_tweets()
-    for t in db["tweets"]:
-        if t["tweet_id"] == tweet_id:
-            return t
-    raise TweetNotFound(f"Tweet ({tweet_id}) introuvable!")
-    
+    t = _store().get(tweet_id)
+    if t is None:
+        raise TweetNotFound(f"Tweet ({tweet_id}) introuvable!")
+    names = {}
+    t = _resolve(t, names)
+    t["replies"] = [_resolve(r, names) for r in _store().replies(tweet_id)[0]]
+    return t
+
+def get_tweets(tweet_ids):
+    """
+    Donne plusieurs tweets en une seule passe (au lieu d'un get_tweet par id).
+
+    Parameters
+    ----------
+    tweet_ids : iterable of str
+        Ids des tweets à trouver.
+
+    Returns
+    -------
+    list of dict
+        Copies des tweets trouvés, dans l'ordre des ids, avec le "username"
+        actuel de leur auteur (comme get_tweet, mais sans les réponses : voir
+        get_replies). Les ids inconnus sont ignorés.
+    """
+    names = {}
+    return [_resolve(t, names) for t in _store().get_many(tweet_ids)]
+
+def get_replies(tweet_id, cursor=None, limit=REPLIES_PAGE_SIZE):
+    """
+    Donne une page des réponses d'un tweet, de la plus ancienne à la plus
+    récente. Seules les réponses de la page sont lues.
+
+    Parameters
+    ----------
+    tweet_id : str
+        Id du tweet.
+    cursor : str, optional
+        Curseur renvoyé par la page précédente. None pour la première page.
+        Un curseur invalide est ignoré (première page).
+    limit : int
+        Nombre maximum de réponses dans la page.
+
+    Raises
+    ------
+    TweetNotFound
+        Si l'id ne correspond à aucun tweet.
+
+    Returns
+    -------
+    replies : list of dict
+        Copies des réponses, avec le "username" actuel de leur auteur.
+    next_cursor : str
+        Curseur de la page suivante, None si c'est la dernière.
+    """
+    if _store().get(tweet_id) is None:
+        raise TweetNotFound(f"Tweet ({tweet_id}) introuvable!")
+    replies, last = _store().replies(tweet_id, _parse_reply_cursor(cursor), limit)
+    names = {}
+    return [_resolve(r, names) for r in replies], _make_reply_cursor(last)
+
 
 def delete_tweet(tweet_id):
     """
@@ -201,21 +1109,9 @@ def delete_tweet(tweet_id):
     -------
     None.
     """
-    db = _load_tweets()
-    before = len(db["tweets"])
-    db["tweets"] = [u for u in db["tweets"] if u["tweet_id"] != tweet_id]
-    after = len(db["tweets"])
-    if after == before:
+    tweet = _store().remove(tweet_id)
+    if tweet is None:
         raise TweetNotFound(f"Tweet ({tweet_id}) introuvable!")
-    _save_tweets(db)
-
-    # Retirer le tweet_id de l'utilisateur correspondant
-    db_users = _load_users()
-    for user in db_users["users"]:
-        if tweet_id in user.get("tweets", []):
-            user["tweets"].remove(tweet_id)
-            break
-    _save_users(db_users)
 
 
 
@@ -240,58 +1136,481 @@ def afficher_tweet(tweet_id):
     t = get_tweet(tweet_id)
     return t["username"], t["date"], t["content"]
 
-def select_random_tweet():
+def _sample(k, max_age, exclude_reported):
+    """Tirage commun à sample_tweets et select_random_tweet (tweets du cache, non copiés)."""
+    since = None if max_age is None else (datetime.now() - timedelta(seconds=max_age)).isoformat()
+    keep = (lambda t: not t.get("reports")) if exclude_reported else None
+    return _store().sample(k, since, keep)
+
+def sample_tweets(k=1, max_age=None, exclude_reported=False):
+    """
+    Tire au sort des tweets distincts (ex : encart "À découvrir"), sans
+    relire ni parcourir la DB : le coût dépend de k, pas du nb de tweets.
+
+    Parameters
+    ----------
+    k : int
+        Nombre de tweets voulus.
+    max_age : int, optional
+        Âge maximum des tweets, en secondes. None pour tous les tweets.
+    exclude_reported : bool
+        Si vrai, les tweets signalés ne sont pas tirés.
+
+    Returns
+    -------
+    list of dict
+        Copies des tweets tirés (voir get_tweets), moins de k s'il n'y en
+        a pas assez.
+    """
+    tweets = _sample(k, max_age, exclude_reported)
+    return get_tweets(t["tweet_id"] for t in tweets)
+
+def select_random_tweet(max_age=None, exclude_reported=False):
     """
     Pour choisir un tweet aléatoirement dans la DB de tweets.
 
+    Parameters
+    ----------
+    max_age : int, optional
+        Âge maximum du tweet, en secondes. None pour tous les tweets.
+    exclude_reported : bool
+        Si vrai, les tweets signalés ne sont pas tirés.
+
     Raises
     ------
     TweetNotFound
-        Si la DB est vide.
+        Si aucun tweet ne correspond.
 
     Returns
     -------
     str
         Id du tweet.
     """
-    db = _load_tweets()
-    if not db["tweets"]:
+    tweets = _sample(1, max_age, exclude_reported)
+    if not tweets:
         raise TweetNotFound("Aucun tweet dans la base de données.")
-    random_tweet = random.choice(db["tweets"])
-    return random_tweet["tweet_id"]
+    return tweets[0]["tweet_id"]
+
+# === TIMELINE ===
+def _parse_cursor(cursor):
+    """
+    Décode un curseur de pagination "<clé de date>_<tweet_id>".
+
+    Returns
+    -------
+    tuple
+        (clé de date, tweet_id), None si pas de curseur ou curseur invalide.
+    """
+    if not cursor:
+        return None
+    date_key, sep, tweet_id = cursor.partition("_")
+    if not sep:
+        return None
+    return (date_key, tweet_id)
+
+def _make_cursor(entry):
+    """Encode (clé de date, tweet_id) en curseur de pagination (None -> None)."""
+    if entry is None:
+        return None
+    return f"{entry[0]}_{entry[1]}"
+
+def _parse_reply_cursor(cursor):
+    """
+    Décode un curseur de réponses "<clé de date>_<seq>_<reply_id>".
+
+    Returns
+    -------
+    tuple
+        Clé de réponse (voir _reply_key), None si pas de curseur ou curseur invalide.
+    """
+    parts = (cursor or "").split("_", 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    return (parts[0], int(parts[1]), parts[2])
+
+def _make_reply_cursor(key):
+    """Encode une clé de réponse en curseur de pagination (None -> None)."""
+    if key is None:
+        return None
+    return f"{key[0]}_{key[1]}_{key[2]}"
+
+def get_timeline_page(before=None, limit=20):
+    """
+    Donne une page de la timeline globale, du plus récent au plus ancien.
+
+    Parameters
+    ----------
+    before : str, optional
+        Curseur renvoyé par la page précédente. None pour la première page.
+        Un curseur invalide est ignoré (première page).
+    limit : int
+        Nombre maximum de tweets dans la page.
+
+    Returns
+    -------
+    tweets : list of dict
+        Les tweets de la page.
+    next_cursor : str
+        Curseur de la page suivante, None si c'est la dernière.
+    """
+    tweets, last = _store().page(_parse_cursor(before), limit)
+    return tweets, _make_cursor(last)
+
+
+# === FIL D'ABONNEMENTS ===
+# Chaque user a une "boîte" bornée (liste triée) avec les derniers tweets des
+# comptes qu'il suit, remplie au moment du post (fan-out à l'écriture). Les
+# comptes avec plus de FANOUT_MAX_FOLLOWERS abonnés ne sont pas copiés dans
+# les boîtes : leurs tweets sont lus à la demande (fan-out à la lecture), dans
+# l'index par auteur. Une page se lit depuis le curseur (bisect), en fusionnant
+# ces listes déjà triées : pas de copie ni de tri de toute la boîte.
+# Les boîtes sont en mémoire et construites au premier affichage du fil. Chaque
+# boîte garde la liste d'abonnements qui a servi à la construire : un
+# follow / unfollow fait dans un autre worker (fichier des users relu) la
+# fait reconstruire.
+_INBOXES = {}  # uid -> (abonnements à la construction, liste triée de (clé de date, tweet_id))
+_INBOX_LOCK = threading.Lock()  # le listener (posts) et l'affichage peuvent tourner en même temps
+
+def _is_fanout_author(user):
+    """True si les tweets de ce user sont copiés dans les boîtes de ses abonnés."""
+    return len(user.get("followers", [])) <= FANOUT_MAX_FOLLOWERS
+
+def _author_entries(uid, position, chunk):
+    """
+    Tweets d'un auteur plus anciens que position, du plus récent au plus
+    ancien, en (clé de date, tweet_id) : lus dans l'index par auteur,
+    chunk à la fois.
+    """
+    while True:
+        tweets, last = _store().page(position, chunk, uid=uid)
+        yield from ((_date_key(t.get("date")), t["tweet_id"]) for t in tweets)
+        if last is None:
+            return
+        position = last
+
+def _inbox_entries(inbox, position, chunk):
+    """
+    Entrées d'une boîte plus anciennes que position, de la plus récente à la
+    plus ancienne. Copiées chunk à la fois sous le verrou ; on reprend après
+    la dernière entrée lue (pas sa position : la boîte a pu bouger).
+    """
+    while True:
+        with _INBOX_LOCK:
+            end = len(inbox) if position is None else bisect_left(inbox, position)
+            part = inbox[max(0, end - chunk):end]
+        if not part:
+            return
+        yield from reversed(part)
+        position = part[0]
+
+def _build_inbox(me):
+    """
+    Construit la boîte d'un user à partir des derniers tweets de ses abonnements
+    (et des siens), pour les comptes qui font du fan-out.
+    """
+    entries = []
+    for uid in [me["uid"]] + me.get("following", []):
+        author = db_auth_utils.get_user_by_uid(uid)
+        if author is not None and _is_fanout_author(author):
+            tweets, _ = _store().page(None, INBOX_SIZE, uid=uid)
+            entries.extend((_date_key(t.get("date")), t["tweet_id"]) for t in tweets)
+    entries.sort()
+    return entries[-INBOX_SIZE:]
+
+def _inbox(me):
+    """Boîte d'un user, (re)construite si elle n'existe pas ou si ses abonnements ont changé."""
+    following = tuple(me.get("following", []))
+    with _INBOX_LOCK:
+        cached = _INBOXES.get(me["uid"])
+    if cached is not None and cached[0] == following:
+        return cached[1]
+    entries = _build_inbox(me)  # hors du verrou : lit la DB
+    with _INBOX_LOCK:
+        _INBOXES[me["uid"]] = (following, entries)
+    return entries
+
+def _fanout(kind, tweet, op):
+    """Listener : copie un nouveau tweet dans les boîtes déjà construites."""
+    if kind == "reset":
+        with _INBOX_LOCK:
+            _INBOXES.clear()
+        return
+    if kind != "post" or not _INBOXES:
+        return
+    author = db_auth_utils.get_user_by_uid(tweet["uid"])
+    if author is None or not _is_fanout_author(author):
+        return
+    entry = (_date_key(tweet.get("date")), tweet["tweet_id"])
+    with _INBOX_LOCK:
+        for uid in [author["uid"]] + author.get("followers", []):
+            cached = _INBOXES.get(uid)
+            if cached is not None:
+                inbox = cached[1]
+                insort(inbox, entry)  # presque toujours à la fin : les posts arrivent dans l'ordre
+                if len(inbox) > INBOX_SIZE:
+                    del inbox[0]
+
+add_listener(_fanout)
+
+def invalidate_home_timeline(username):
+    """
+    Oublie la boîte d'un user (ex : après un follow/unfollow).
+    Elle sera reconstruite au prochain affichage.
+
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur.
+    """
+    uid = _viewer_uid(username)
+    with _INBOX_LOCK:
+        _INBOXES.pop(uid, None)
+
+def get_home_timeline(username, before=None, limit=20):
+    """
+    Donne une page du fil d'abonnements d'un user : ses tweets et ceux des
+    comptes qu'il suit, du plus récent au plus ancien. Seules les entrées
+    de la page (et une de plus, pour savoir s'il y a une suite) sont lues.
+
+    Parameters
+    ----------
+    username : str
+        Nom d'utilisateur.
+    before : str, optional
+        Curseur renvoyé par la page précédente. None pour la première page.
+    limit : int
+        Nombre maximum de tweets dans la page.
+
+    Raises
+    ------
+    UserNotFoundError
+        Si l'utilisateur n'existe pas.
+
+    Returns
+    -------
+    tweets : list of dict
+        Les tweets de la page.
+    next_cursor : str
+        Curseur de la page suivante, None si c'est la dernière.
+    """
+    _store().data()  # recharge (et vide les boîtes) si la DB a changé
+    me = db_auth_utils.get_user(username)
+    if me is None:
+        raise db_auth_utils.UserNotFoundError(f"Utilisateur '{username}' introuvable.")
+
+    position = _parse_cursor(before)
+    sources = [_inbox_entries(_inbox(me), position, limit + 1)]
+    # Fan-out à la lecture pour les comptes très suivis
+    for uid in [me["uid"]] + me.get("following", []):
+        author = db_auth_utils.get_user_by_uid(uid)
+        if author is not None and not _is_fanout_author(author):
+            sources.append(_author_entries(uid, position, limit + 1))
+
+    tweets = []
+    seen = set()
+    last = None
+    for entry in heapq.merge(*sources, reverse=True):
+        if entry[1] in seen:
+            continue  # dans la boîte et lu à la demande (compte passé au-dessus du seuil)
+        seen.add(entry[1])
+        t = _store().get(entry[1])
+        if t is None:
+            continue  # supprimé depuis
+        if len(tweets) == limit:
+            return tweets, _make_cursor(last)  # il reste au moins un tweet : page suivante
+        tweets.append(t)
+        last = entry
+    return tweets, None
+
+
+# === ACTIVITÉ PAR USER ===
+# Index uid -> ce que le user a fait (tweets, réponses, likes, retweets), tenu à
+# jour par un listener. Sert à supprimer un compte en ne touchant que les
+# tweets concernés, sans parcourir toute la DB.
+# Construit au premier usage, et reconstruit après un rechargement complet.
+_ACTIVITY = None  # uid -> {"tweets": set, "replies": set de (tweet_id, reply_id), "likes": set, "retweets": set}
+
+def _activity_of(uid):
+    """Entrée de l'index pour un uid (créée si besoin)."""
+    entry = _ACTIVITY.get(uid)
+    if entry is None:
+        entry = _ACTIVITY[uid] = {"tweets": set(), "replies": set(), "likes": set(), "retweets": set()}
+    return entry
+
+def _index_activity(tweet):
+    """Ajoute un tweet (auteur, likes, retweets) à l'index."""
+    tweet_id = tweet["tweet_id"]
+    _activity_of(tweet.get("uid"))["tweets"].add(tweet_id)
+    for key in ("likes", "retweets"):
+        for uid in tweet.get(key, ()):
+            _activity_of(uid)[key].add(tweet_id)
+
+def _unindex_activity(tweet):
+    """Retire un tweet supprimé de l'index (ses réponses partent par "unreply")."""
+    tweet_id = tweet["tweet_id"]
+    _activity_of(tweet.get("uid"))["tweets"].discard(tweet_id)
+    for key in ("likes", "retweets"):
+        for uid in tweet.get(key, ()):
+            _activity_of(uid)[key].discard(tweet_id)
+
+def _track_activity(kind, tweet, op):
+    """Listener : met l'index à jour à chaque opération."""
+    global _ACTIVITY
+    if kind == "reset":
+        _ACTIVITY = None
+        return
+    if _ACTIVITY is None:
+        return  # pas encore construit : il le sera à partir de la DB à jour
+    if kind == "post":
+        _index_activity(tweet)
+    elif kind == "delete":
+        _unindex_activity(tweet)
+    elif kind in ("like", "retweet"):
+        _activity_of(_op_uid(op))[kind + "s"].add(tweet["tweet_id"])
+    elif kind in ("unlike", "unretweet"):
+        _activity_of(_op_uid(op))[kind[2:] + "s"].discard(tweet["tweet_id"])
+    elif kind == "reply":
+        _activity_of(op["reply"]["uid"])["replies"].add((tweet["tweet_id"], op["reply"]["reply_id"]))
+    elif kind == "unreply":
+        _activity_of(op["uid"])["replies"].discard((tweet["tweet_id"], op["reply_id"]))
+
+add_listener(_track_activity)
+
+def get_user_activity(uid):
+    """
+    Ce qu'un user a fait, d'après l'index (sans parcourir les tweets).
+
+    Parameters
+    ----------
+    uid : str
+        Identifiant du user.
+
+    Returns
+    -------
+    dict
+        Copie de l'entrée : {"tweets": set de tweet_id, "replies": set de
+        (tweet_id, reply_id), "likes": set de tweet_id, "retweets": set de tweet_id}.
+    """
+    global _ACTIVITY
+    db = _store().data()  # recharge (et vide l'index) si la DB a changé
+    if _ACTIVITY is None:
+        _ACTIVITY = {}
+        for t in db.get("tweets", []):
+            _index_activity(t)
+        for tweet_id, thread in db.get("replies", {}).items():
+            for r in thread:
+                _activity_of(r.get("uid"))["replies"].add((tweet_id, r["reply_id"]))
+    entry = _ACTIVITY.get(uid, {})
+    return {key: set(entry.get(key, ())) for key in ("tweets", "replies", "likes", "retweets")}
+
+def purge_user_activity(uid):
+    """
+    Retire les likes, retweets et réponses d'un user (compte supprimé).
+    Seuls les tweets concernés sont modifiés. Ses tweets restent, affichés
+    avec DELETED_USERNAME.
+
+    Parameters
+    ----------
+    uid : str
+        Identifiant du user.
+
+    Returns
+    -------
+    int
+        Nombre d'opérations faites.
+    """
+    with _store().transaction():
+        activity = get_user_activity(uid)
+        for tweet_id in activity["likes"]:
+            _store().apply({"op": "unlike", "tweet_id": tweet_id, "uid": uid})
+        for tweet_id in activity["retweets"]:
+            _store().apply({"op": "unretweet", "tweet_id": tweet_id, "uid": uid})
+        for tweet_id, reply_id in activity["replies"]:
+            _store().apply({"op": "unreply", "tweet_id": tweet_id, "reply_id": reply_id, "uid": uid})
+    return len(activity["likes"]) + len(activity["retweets"]) + len(activity["replies"])
+
+
+# === AFFICHAGE ===
+def _format_date(date):
+    """
+    Formate une date ISO pour l'affichage : "2025-10-14T11:22:59" -> "2025-10-14 11:22".
+    """
+    try:
+        return date.replace("T", " ")[:16]
+    except AttributeError:
+        return date
+
+def timeline_view(tweets, viewer):
+    """
+    Prépare les tweets pour la timeline en une seule passe sur les données
+    en mémoire : le template n'a plus besoin de rappeler has_user_liked,
+    get_likes_count... pour chaque tweet.
+
+    Parameters
+    ----------
+    tweets : list of dict
+        Tweets à afficher, dans l'ordre d'affichage.
+    viewer : str
+        Username de l'utilisateur connecté.
+
+    Returns
+    -------
+    list of dict
+        Copies des tweets (le cache n'est pas modifié), avec la date formatée et :
+        - "username" : nom actuel de l'auteur
+        - "liked" / "likes_count"
+        - "retweeted" / "retweet_count"
+        - "reply_count" et "replies" : les REPLIES_PREVIEW premières réponses
+          (avec "username"), "replies_cursor" : curseur de get_replies pour
+          la suite (None s'il n'y en a pas d'autres)
+    """
+    viewer = _viewer_uid(viewer)
+    names = {}
+    view = []
+    previews = _store().previews([t["tweet_id"] for t in tweets], REPLIES_PREVIEW)
+    for t in tweets:
+        likes = t.get("likes", ())
+        retweets = t.get("retweets", ())
+        item = _resolve(t, names)
+        count, first = previews[t["tweet_id"]]
+        item["reply_count"] = count
+        item["replies"] = [_resolve(r, names) for r in first]
+        item["replies_cursor"] = _make_reply_cursor(_reply_key(first[-1])) if count > len(first) else None
+        item["date"] = _format_date(t.get("date", ""))
+        item["liked"] = viewer in likes
+        item["likes_count"] = len(likes)
+        item["retweeted"] = viewer in retweets
+        item["retweet_count"] = len(retweets)
+        view.append(item)
+    return view
+
 
 # === LIKES ===
 def like_tweet(tweet_id: str, username: str):
     """Ajoute ou retire un like (toggle)"""
-    db = _load_tweets()
-    tweet = None
-    for t in db["tweets"]:
-        if t["tweet_id"] == tweet_id:
-            tweet = t
-            break
-    if not tweet:
-        raise TweetNotFound(f"Tweet {tweet_id} introuvable")
-
-    likes = tweet.get("likes", [])
-    if username in likes:
-        likes.remove(username)   # unlike
-    else:
-        likes.append(username)   # like
-
-    tweet["likes"] = likes
-    _save_tweets(db)
+    with _store().transaction():
+        tweet = _store().get(tweet_id)
+        if not tweet:
+            raise TweetNotFound(f"Tweet {tweet_id} introuvable")
+
+        uid = db_auth_utils.get_uid(username)
+        if uid in tweet.get("likes", ()):
+            op = "unlike"
+        else:
+            op = "like"
+        _store().apply({"op": op, "tweet_id": tweet_id, "uid": uid}, sync=True)
 
 def get_likes_count(tweet_id: str) -> int:
     try:
         tweet = get_tweet(tweet_id)
-        return len(tweet.get("likes", []))
+        return len(tweet.get("likes", ()))
     except TweetNotFound:
         return 0
 
 def has_user_liked(tweet_id: str, username: str) -> bool:
     try:
         tweet = get_tweet(tweet_id)
-        return username in tweet.get("likes", [])
+        return _viewer_uid(username) in tweet.get("likes", ())
     except TweetNotFound:
         return False
 
@@ -301,26 +1620,20 @@ def add_reply(tweet_id: str, username: str, content: str):
     if len(content) > 280:  # ou 140 si tu veux rester old-school
         raise TweetTooLong("Réponse trop longue !")
 
-    db = _load_tweets()
-    tweet = None
-    for t in db["tweets"]:
-        if t["tweet_id"] == tweet_id:
-            tweet = t
-            break
-    if not tweet:
-        raise TweetNotFound(f"Tweet {tweet_id} introuvable")
-
     reply = {
         "reply_id": str(uuid.uuid4()),
-        "username": username,
+        "uid": db_auth_utils.get_uid(username),
         "date": datetime.now().isoformat(timespec="seconds"),
         "content": content
     }
 
-    if "replies" not in tweet:
-        tweet["replies"] = []
-    tweet["replies"].append(reply)
-    _save_tweets(db)
+    with _store().transaction():
+        # Vérifié sous le verrou : un tweet supprimé entre temps n'a pas de réponse orpheline
+        if not _store().get(tweet_id):
+            raise TweetNotFound(f"Tweet {tweet_id} introuvable")
+        # Départage les réponses de la même seconde (l'uuid ne suit pas l'ordre d'arrivée)
+        reply["seq"] = _store().next_reply_seq()
+        _store().apply({"op": "reply", "tweet_id": tweet_id, "reply": reply}, sync=True)
     return reply
 
 # =========================================
@@ -332,43 +1645,30 @@ def toggle_retweet(tweet_id: str, username: str):
     Fait un retweet ou annule un retweet (toggle).
     Retourne (is_now_retweeted: bool, nouveau_compteur: int)
     """
-    db = _load_tweets()
-    tweet = None
-    
-    for t in db["tweets"]:
-        if t["tweet_id"] == tweet_id:
-            tweet = t
-            break
-    
-    if not tweet:
-        raise TweetNotFound(f"Tweet {tweet_id} introuvable")
+    with _store().transaction():
+        tweet = _store().get(tweet_id)
 
-    # Initialisation si le tweet est ancien
-    if "retweets" not in tweet:
-        tweet["retweets"] = []                    # liste des usernames qui ont retweeté
-    if "retweet_count" not in tweet:
-        tweet["retweet_count"] = 0
-
-    if username in tweet["retweets"]:
-        # → Annuler le retweet
-        tweet["retweets"].remove(username)
-        tweet["retweet_count"] -= 1
-        is_retweeted = False
-    else:
-        # → Retweeter
-        tweet["retweets"].append(username)
-        tweet["retweet_count"] += 1
-        is_retweeted = True
+        if not tweet:
+            raise TweetNotFound(f"Tweet {tweet_id} introuvable")
 
-    _save_tweets(db)
-    return is_retweeted, tweet["retweet_count"]
+        uid = db_auth_utils.get_uid(username)
+        if uid in tweet.get("retweets", ()):
+            # → Annuler le retweet
+            _store().apply({"op": "unretweet", "tweet_id": tweet_id, "uid": uid}, sync=True)
+            is_retweeted = False
+        else:
+            # → Retweeter
+            _store().apply({"op": "retweet", "tweet_id": tweet_id, "uid": uid}, sync=True)
+            is_retweeted = True
+
+        return is_retweeted, len(tweet.get("retweets", ()))
 
 
 def has_user_retweeted(tweet_id: str, username: str) -> bool:
     """Pour savoir si l’utilisateur a déjà retweeté (bouton vert dans le template)"""
     try:
         tweet = get_tweet(tweet_id)
-        return username in tweet.get("retweets", [])
+        return _viewer_uid(username) in tweet.get("retweets", ())
     except TweetNotFound:
         return False
 
@@ -377,6 +1677,66 @@ def get_retweet_count(tweet_id: str) -> int:
     """Nombre de retweets d’un tweet"""
     try:
         tweet = get_tweet(tweet_id)
-        return tweet.get("retweet_count", 0)
+        return len(tweet.get("retweets", ()))
     except TweetNotFound:
-        return 0
\ No newline at end of file
+        return 0
+
+
+# === MÉDIAS ===
+def set_media_variants(tweet_id: str, variants: dict):
+    """
+    Enregistre sur un tweet les versions dérivées de son média
+    (miniature, version web, image d'aperçu d'une vidéo...).
+
+    Parameters
+    ----------
+    tweet_id : str
+        Id du tweet.
+    variants : dict
+        Versions générées (voir media_utils.build_variants).
+
+    Raises
+    ------
+    TweetNotFound
+        Si l'id ne correspond à aucun tweet.
+    """
+    if _store().get(tweet_id) is None:
+        raise TweetNotFound(f"Tweet {tweet_id} introuvable")
+    _store().apply({"op": "media", "tweet_id": tweet_id, "variants": variants})
+
+
+# === SIGNALEMENTS ===
+def add_report(tweet_id: str, username: str) -> int:
+    """
+    Signale un tweet.
+
+    Parameters
+    ----------
+    tweet_id : str
+        Id du tweet signalé.
+    username : str
+        Utilisateur qui signale.
+
+    Raises
+    ------
+    TweetNotFound
+        Si l'id ne correspond à aucun tweet.
+    AlreadyReported
+        Si l'utilisateur a déjà signalé ce tweet.
+
+    Returns
+    -------
+    int
+        Nombre de signalements du tweet.
+    """
+    with _store().transaction():
+        tweet = _store().get(tweet_id)
+        if not tweet:
+            raise TweetNotFound(f"Tweet {tweet_id} introuvable")
+        uid = db_auth_utils.get_uid(username)
+        if uid in tweet.get("reporters", ()):
+            raise AlreadyReported(f"Tweet {tweet_id} déjà signalé par {username}")
+        # La date sert à la file de modération (signalements par heure)
+        _store().apply({"op": "report", "tweet_id": tweet_id, "uid": uid,
+                        "date": datetime.now().isoformat(timespec="seconds")}, sync=True)
+        return tweet["reports"]
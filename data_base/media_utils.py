@@ -0,0 +1,176 @@
+import os
+import shutil
+import subprocess
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import db_tweet_utils
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow pas installé : pas de miniatures, on sert l'original
+    Image = None
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Générer aussi du WebP/AVIF quand le navigateur le supporte
+    # Miniatures animées pour les GIF
+
+#------------ Variables globales ------------#
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static")  #les media_path sont relatifs à ce dossier
+VARIANTS_SUBFOLDER = "variants"  #sous-dossier (dans celui du média) pour les versions redimensionnées
+
+VARIANT_WIDTHS = {"thumb": 320, "web": 1080}  #largeur max de chaque version
+JPEG_QUALITY = 80
+MEDIA_WORKERS = 2  #nb de threads qui traitent les uploads en arrière-plan
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg"}
+VIDEO_EXTENSIONS = {"mp4", "mov"}
+
+_EXECUTOR = None
+
+
+#------------ Fonctions internes ------------#
+def _executor():
+    """Pool de threads créé au premier upload."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=MEDIA_WORKERS, thread_name_prefix="media")
+    return _EXECUTOR
+
+def _extension(media_path):
+    """Extension du fichier en minuscules, sans le point."""
+    return media_path.rsplit(".", 1)[-1].lower() if "." in media_path else ""
+
+def _variant_path(media_path, suffix):
+    """
+    Chemin (relatif à static) d'une version dérivée :
+    "uploads/plage.jpg" -> "uploads/variants/plage_thumb.jpg".
+    """
+    folder, filename = os.path.split(media_path)
+    stem = filename.rsplit(".", 1)[0]
+    return f"{folder}/{VARIANTS_SUBFOLDER}/{stem}_{suffix}.jpg" if folder else f"{VARIANTS_SUBFOLDER}/{stem}_{suffix}.jpg"
+
+def _absolute(media_path):
+    """Chemin absolu d'un fichier de static."""
+    return os.path.join(STATIC_FOLDER, *media_path.split("/"))
+
+def _resize(source, media_path):
+    """
+    Crée les versions redimensionnées d'une image.
+
+    Parameters
+    ----------
+    source : str
+        Chemin absolu de l'image d'origine.
+    media_path : str
+        Chemin relatif à static, sert à nommer les versions.
+
+    Returns
+    -------
+    dict
+        {"thumb": {"path": ..., "width": ...}, "web": {...}, "original": {...}}.
+        Une version plus grande que l'original n'est pas créée.
+    """
+    variants = {}
+    with Image.open(source) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        for name, width in VARIANT_WIDTHS.items():
+            if im.width <= width:
+                continue
+            copy = im.copy()
+            copy.thumbnail((width, width * 10))
+            path = _variant_path(media_path, name)
+            os.makedirs(os.path.dirname(_absolute(path)), exist_ok=True)
+            copy.save(_absolute(path), "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            variants[name] = {"path": path, "width": copy.width}
+        if variants:
+            # Largeur de l'original, pour le srcset
+            variants["original"] = {"path": media_path, "width": im.width}
+    return variants
+
+def _poster(source, media_path):
+    """
+    Extrait la première image d'une vidéo avec ffmpeg.
+
+    Returns
+    -------
+    str
+        Chemin (relatif à static) de l'image, None si ffmpeg n'est pas disponible.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return None
+    path = _variant_path(media_path, "poster")
+    os.makedirs(os.path.dirname(_absolute(path)), exist_ok=True)
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-i", source,
+                    "-frames:v", "1", "-q:v", "3", _absolute(path)],
+                   check=True, timeout=60)
+    return path
+
+
+#------------ Fonctions publiques ------------#
+def build_variants(media_path):
+    """
+    Génère les versions dérivées d'un média (miniature, version web, image
+    d'aperçu pour les vidéos).
+
+    Parameters
+    ----------
+    media_path : str
+        Chemin du média, relatif au dossier static ("uploads/plage.jpg").
+
+    Returns
+    -------
+    dict
+        Versions créées, ex : {"thumb": {"path": ..., "width": 320},
+        "web": {...}, "original": {...}, "poster": "uploads/variants/clip_poster.jpg"}.
+        Vide si rien n'a pu être généré (Pillow/ffmpeg absents, GIF...).
+    """
+    source = _absolute(media_path)
+    extension = _extension(media_path)
+    variants = {}
+    if extension in VIDEO_EXTENSIONS:
+        poster = _poster(source, media_path)
+        if poster is None:
+            return variants
+        variants["poster"] = poster
+        source = _absolute(poster)
+    elif extension not in IMAGE_EXTENSIONS:
+        return variants  # GIF : on garde l'original pour ne pas perdre l'animation
+    if Image is not None:
+        variants.update(_resize(source, media_path))
+    return variants
+
+def process_media(tweet_id, media_path):
+    """
+    Génère les versions d'un média et les enregistre sur le tweet.
+    Les erreurs sont affichées mais ne remontent pas (on sert alors l'original).
+
+    Parameters
+    ----------
+    tweet_id : str
+        Id du tweet qui contient le média.
+    media_path : str
+        Chemin du média, relatif au dossier static.
+    """
+    try:
+        variants = build_variants(media_path)
+        if variants:
+            db_tweet_utils.set_media_variants(tweet_id, variants)
+    except Exception as e:
+        print(f"Erreur traitement média {media_path} :", e)
+        traceback.print_exc()
+
+def submit_media(tweet_id, media_path):
+    """
+    Lance process_media en arrière-plan, pour que la requête d'upload
+    réponde tout de suite.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        Permet d'attendre la fin du traitement (tests).
+    """
+    return _executor().submit(process_media, tweet_id, media_path)
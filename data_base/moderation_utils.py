@@ -0,0 +1,116 @@
+import heapq
+import threading
+from datetime import datetime
+import db_tweet_utils
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Pouvoir classer un signalement sans suite (le tweet sort de la file sans être supprimé)
+    # Donner moins de poids aux signalements des comptes qui signalent beaucoup à tort
+
+#------------ Variables globales ------------#
+MODERATION_PAGE_SIZE = 20  #nb de tweets renvoyés par la file de modération
+VELOCITY_MIN_HOURS = 1  #durée minimale (en heures) pour calculer la vitesse : un signalement isolé vaut 1 par heure
+
+# File de priorité des tweets signalés, construite au premier affichage puis
+# tenue à jour par un listener. Un tweet qui change de priorité est ajouté à
+# nouveau dans le tas ; l'ancienne entrée est ignorée quand elle remonte.
+_QUEUE = None  # tas de (-nb de signalements, -vitesse, tweet_id)
+_KEYS = {}  # tweet_id -> entrée valide du tweet dans le tas
+_LOCK = threading.Lock()  # le listener (écritures) et l'affichage peuvent tourner en même temps
+
+
+#------------ Fonctions internes ------------#
+def _velocity(tweet):
+    """
+    Vitesse des signalements d'un tweet : nb de signalements par heure entre
+    le premier et le dernier. 0 si les dates sont inconnues (anciens tweets).
+    """
+    try:
+        first = datetime.fromisoformat(tweet["first_report"])
+        last = datetime.fromisoformat(tweet["last_report"])
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+    hours = max((last - first).total_seconds() / 3600, VELOCITY_MIN_HOURS)
+    return len(tweet.get("reporters", ())) / hours
+
+def _push(tweet):
+    """Met à jour la priorité d'un tweet (le retire de la file s'il n'est plus signalé)."""
+    tweet_id = tweet["tweet_id"]
+    if not tweet.get("reporters"):
+        _KEYS.pop(tweet_id, None)
+        return
+    key = (-len(tweet["reporters"]), -_velocity(tweet), tweet_id)
+    _KEYS[tweet_id] = key
+    heapq.heappush(_QUEUE, key)
+
+def _track(kind, tweet, op):
+    """Listener : nouveau signalement, tweet supprimé."""
+    global _QUEUE
+    with _LOCK:
+        if kind == "reset":
+            _QUEUE = None
+            return
+        if _QUEUE is None:
+            return  # pas encore construite : elle le sera à partir de la DB à jour
+        if kind == "report":
+            _push(tweet)
+        elif kind == "delete":
+            _KEYS.pop(tweet["tweet_id"], None)  # son entrée du tas sera ignorée
+
+db_tweet_utils.add_listener(_track)
+
+def _build():
+    """
+    Met la DB des tweets à jour (le listener suit) et construit la file à
+    partir des tweets signalés si elle n'existe pas encore.
+    """
+    global _QUEUE, _KEYS
+    db = db_tweet_utils._store().data()  # hors du verrou : peut recharger la DB et appeler _track
+    with _LOCK:
+        if _QUEUE is not None:
+            return
+        _QUEUE, _KEYS = [], {}
+        for t in list(db.get("tweets", [])):
+            if t.get("reporters"):
+                _KEYS[t["tweet_id"]] = (-len(t["reporters"]), -_velocity(t), t["tweet_id"])
+        _QUEUE = list(_KEYS.values())
+        heapq.heapify(_QUEUE)
+
+
+#------------ Fonctions publiques ------------#
+def get_moderation_queue(limit=MODERATION_PAGE_SIZE):
+    """
+    Tweets signalés, les plus urgents en premier : les plus signalés, puis à
+    nombre égal ceux signalés le plus vite. Seules les entrées de tête de
+    la file sont lues (pas de parcours des tweets).
+
+    Parameters
+    ----------
+    limit : int
+        Nombre maximum de tweets.
+
+    Returns
+    -------
+    list of dict
+        Copies des tweets (voir db_tweet_utils.get_tweets), avec "reports"
+        (nb de signalements) et "velocity" (signalements par heure).
+    """
+    while True:
+        _build()  # rejoue les écritures des autres workers, construit la file au premier appel
+        with _LOCK:
+            if _QUEUE is None:
+                continue  # DB rechargée entre temps : on reconstruit
+            top = []
+            while _QUEUE and len(top) < limit:
+                key = heapq.heappop(_QUEUE)
+                if _KEYS.get(key[2]) == key:  # sinon : entrée périmée (tweet supprimé ou re-signalé)
+                    top.append(key)
+            for key in top:
+                heapq.heappush(_QUEUE, key)
+            break
+    scores = {tweet_id: (-count, -velocity) for count, velocity, tweet_id in top}
+    tweets = db_tweet_utils.get_tweets(scores)  # un tweet supprimé entre temps est ignoré
+    for t in tweets:
+        t["reports"], t["velocity"] = scores[t["tweet_id"]]
+    return tweets
@@ -0,0 +1,228 @@
+import math
+import re
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+import db_tweet_utils
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Recherche par préfixe sur le dernier mot (autocomplétion)
+    # Racinisation (chats -> chat) et tolérance aux fautes de frappe (trigrammes, comme pour les usernames)
+
+#------------ Variables globales ------------#
+SEARCH_PAGE_SIZE = 20  #nb de résultats par page
+BM25_K1 = 1.2  #saturation de la fréquence d'un mot dans un tweet
+BM25_B = 0.75  #pénalité des textes longs (tweet + réponses)
+
+# Mots trop fréquents pour servir à la recherche
+STOPWORDS = {
+    "a", "au", "aux", "c", "ce", "ces", "d", "dans", "de", "des", "du", "elle", "en", "est",
+    "et", "il", "j", "je", "l", "la", "le", "les", "leur", "m", "ma", "mais", "me", "mes",
+    "mon", "n", "ne", "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "s",
+    "sa", "se", "ses", "son", "sur", "t", "ta", "te", "tes", "ton", "tu", "un", "une", "vous",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Ligatures que NFKD ne décompose pas (sinon "cœur" donnerait "c" + "ur")
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "OE", "æ": "ae", "Æ": "AE"})
+
+# Index inversé, construit à la première recherche puis tenu à jour par un listener
+_INDEX = None  # mot -> {tweet_id: nb d'occurrences}
+_DOC_TOKENS = {}  # tweet_id -> Counter des mots du tweet (et de ses réponses)
+_DOC_DATES = {}  # tweet_id -> clé de date, pour départager les ex æquo
+_TOTAL_LEN = 0  # somme des longueurs des documents (pour la longueur moyenne)
+_LOCK = threading.Lock()  # le listener (écritures) et les recherches peuvent tourner en même temps
+
+
+#------------ Fonctions internes ------------#
+def _document(tweet):
+    """Mots indexés d'un tweet : son contenu et celui de ses réponses."""
+    tokens = Counter(tokenize(tweet.get("content") or ""))
+    for r in db_tweet_utils._store().replies_of(tweet["tweet_id"]):
+        tokens.update(tokenize(r.get("content") or ""))
+    return tokens
+
+def _unindex(tweet_id):
+    """Retire un tweet de l'index (sans effet s'il n'y est pas)."""
+    global _TOTAL_LEN
+    tokens = _DOC_TOKENS.pop(tweet_id, None)
+    _DOC_DATES.pop(tweet_id, None)
+    if tokens is None:
+        return
+    _TOTAL_LEN -= sum(tokens.values())
+    for token in tokens:
+        postings = _INDEX.get(token)
+        if postings is not None:
+            postings.pop(tweet_id, None)
+            if not postings:
+                del _INDEX[token]
+
+def _index(tweet):
+    """Ajoute (ou remplace) un tweet dans l'index."""
+    global _TOTAL_LEN
+    tweet_id = tweet["tweet_id"]
+    _unindex(tweet_id)
+    tokens = _document(tweet)
+    _DOC_TOKENS[tweet_id] = tokens
+    _DOC_DATES[tweet_id] = db_tweet_utils._date_key(tweet.get("date"))
+    _TOTAL_LEN += sum(tokens.values())
+    for token, count in tokens.items():
+        _INDEX.setdefault(token, {})[tweet_id] = count
+
+def _add_reply(tweet, reply):
+    """Ajoute les mots d'une nouvelle réponse au document du tweet (sans relire le fil)."""
+    global _TOTAL_LEN
+    tweet_id = tweet["tweet_id"]
+    doc = _DOC_TOKENS.get(tweet_id)
+    if doc is None:
+        _index(tweet)  # tweet pas encore indexé : il l'est avec toutes ses réponses
+        return
+    tokens = Counter(tokenize(reply.get("content") or ""))
+    doc.update(tokens)
+    _TOTAL_LEN += sum(tokens.values())
+    for token in tokens:
+        _INDEX.setdefault(token, {})[tweet_id] = doc[token]
+
+def _track(kind, tweet, op):
+    """Listener : met l'index à jour (nouveau tweet, suppression, réponse)."""
+    global _INDEX
+    with _LOCK:
+        if kind == "reset":
+            _INDEX = None
+            return
+        if _INDEX is None:
+            return  # pas encore construit : il le sera à partir de la DB à jour
+        if kind == "delete":
+            _unindex(tweet["tweet_id"])
+        elif kind == "reply":
+            _add_reply(tweet, op["reply"])
+        elif kind in ("post", "unreply"):
+            _index(tweet)
+
+db_tweet_utils.add_listener(_track)
+
+def _build():
+    """
+    Met la DB des tweets à jour (le listener suit) et construit l'index à
+    partir de tous les tweets s'il n'existe pas encore.
+    """
+    global _INDEX, _DOC_TOKENS, _DOC_DATES, _TOTAL_LEN
+    db = db_tweet_utils._store().data()  # hors du verrou : peut recharger la DB et appeler _track
+    with _LOCK:
+        if _INDEX is not None:
+            return
+        _INDEX, _DOC_TOKENS, _DOC_DATES, _TOTAL_LEN = {}, {}, {}, 0
+        for t in list(db.get("tweets", [])):
+            _index(t)
+
+def _ranked(tokens):
+    """
+    Tweets qui contiennent tous les mots, avec leur score de pertinence (BM25).
+    Seules les listes des mots recherchés sont parcourues.
+
+    Returns
+    -------
+    list of tuple
+        (score, clé de date, tweet_id), non triés : à score égal, le tuple
+        met le plus récent devant.
+    """
+    postings = [_INDEX.get(token) for token in tokens]
+    if not postings or any(p is None for p in postings):
+        return []
+    postings.sort(key=len)
+    candidates = set(postings[0])
+    for p in postings[1:]:
+        candidates.intersection_update(p)
+        if not candidates:
+            return []
+
+    nb_docs = len(_DOC_TOKENS)
+    avg_len = _TOTAL_LEN / nb_docs if nb_docs else 1
+    scored = []
+    for tweet_id in candidates:
+        length = sum(_DOC_TOKENS[tweet_id].values())
+        score = 0.0
+        for p in postings:
+            tf = p[tweet_id]
+            idf = math.log(1 + (nb_docs - len(p) + 0.5) / (len(p) + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+        scored.append((score, _DOC_DATES.get(tweet_id, ""), tweet_id))
+    return scored
+
+
+#------------ Fonctions publiques ------------#
+def fold(text):
+    """
+    Met un texte en minuscules et sans accents : "Été" -> "ete",
+    "Cœur" -> "coeur".
+
+    Parameters
+    ----------
+    text : str
+        Texte à normaliser.
+
+    Returns
+    -------
+    str
+        Texte normalisé.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.translate(_LIGATURES).lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def tokenize(text):
+    """
+    Découpe un texte en mots pour la recherche : minuscules, sans accents,
+    sans les mots vides ("le", "de"...).
+
+    Parameters
+    ----------
+    text : str
+        Texte à découper.
+
+    Returns
+    -------
+    list of str
+        Les mots, dans l'ordre du texte : "L'été à l'INSA" -> ["ete", "insa"].
+    """
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+def search_tweets(query, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Cherche les tweets qui contiennent tous les mots de la recherche (dans
+    le tweet ou dans ses réponses), les plus pertinents en premier.
+    Les accents et majuscules sont ignorés.
+
+    Parameters
+    ----------
+    query : str
+        Texte recherché.
+    cursor : str, optional
+        Curseur renvoyé par la page précédente. None pour la première page.
+        Un curseur invalide est ignoré (première page).
+    limit : int
+        Nombre maximum de tweets dans la page.
+
+    Returns
+    -------
+    tweets : list of dict
+        Copies des tweets de la page (voir db_tweet_utils.get_tweets).
+    next_cursor : str
+        Curseur de la page suivante, None si c'est la dernière.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return [], None
+    offset = int(cursor) if cursor and cursor.isdigit() else 0
+    while True:
+        _build()  # rejoue les écritures des autres workers, construit l'index au premier appel
+        with _LOCK:
+            if _INDEX is None:
+                continue  # DB rechargée entre temps : on reconstruit
+            scored = _ranked(tokens)
+            best = heapq.nlargest(offset + limit, scored)[offset:]
+            break
+    tweets = db_tweet_utils.get_tweets(tweet_id for _, _, tweet_id in best)
+    next_cursor = str(offset + limit) if len(scored) > offset + limit else None
+    return tweets, next_cursor
@@ -24,6 +24,8 @@ class TestDBAuthUtils(unittest.TestCase):
         """
         if os.path.exists(self.tmp_db.name):
             os.remove(self.tmp_db.name)
+        if os.path.exists(self.tmp_db.name + ".lock"):
+            os.remove(self.tmp_db.name + ".lock")
 
     def test_add_user_and_count(self):
         auth.add_user("alice", "alice@example.com", "pass123")
@@ -62,6 +64,112 @@ class TestDBAuthUtils(unittest.TestCase):
         with self.assertRaises(auth.UserNotFoundError):
             auth.delete_user("frank")
 
+    def test_email_lookup_ignores_case(self):
+        auth.add_user("gina", "Gina@Example.com", "Password123")
+        self.assertEqual(auth.get_user_by_email("gina@example.com")["username"], "gina")
+        with self.assertRaises(auth.EmailExistsError):
+            auth.test_email("GINA@example.com")
+
+    def test_indexes_follow_external_changes(self):
+        auth.add_user("hugo", "hugo@example.com", "Password123")
+        # Un autre process réécrit la DB
+        import json
+        with open(auth.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"users": [{"username": "ines", "email": "ines@example.com",
+                                  "password_hash": "", "salt": "", "tweets": []}]}, f)
+        self.assertIsNone(auth.get_user("hugo"))
+        self.assertEqual(auth.get_user_by_email("ines@example.com")["username"], "ines")
+
+    def test_search_usernames(self):
+        for name in ("Jean", "jeanne", "Jules", "karim"):
+            auth.add_user(name, f"{name}@example.com", "Password123")
+        self.assertEqual(auth.search_usernames("je"), ["Jean", "jeanne"])
+        self.assertEqual(auth.search_usernames("J", limit=2), ["Jean", "jeanne"])
+        auth.delete_user("jeanne")
+        self.assertEqual(auth.search_usernames("je"), ["Jean"])
+
+    def test_suggest_usernames(self):
+        for name in ("clelia", "camille", "laura"):
+            auth.add_user(name, f"{name}@example.com", "Password123")
+        self.assertEqual(auth.suggest_usernames("clelai")[0], "clelia")
+        self.assertIn("laura", auth.suggest_usernames("laur"))
+        self.assertEqual(auth.suggest_usernames("zzzz"), [])
+
+    def test_uid(self):
+        import json
+        # Compte d'avant les uid : son username sert d'uid
+        with open(auth.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"users": [{"username": "olga", "email": "olga@example.com"}]}, f)
+        self.assertEqual(auth.get_uid("olga"), "olga")
+        auth.add_user("olga2", "olga2@example.com", "Password123")
+        uid = auth.get_uid("olga2")
+        self.assertNotEqual(uid, "olga2")
+        self.assertEqual(auth.get_user_by_uid(uid)["username"], "olga2")
+        auth.delete_user("olga2")
+        self.assertIsNone(auth.get_user_by_uid(uid))
+        self.assertEqual(auth.get_username(uid), auth.DELETED_USERNAME)
+
+    def test_profile_picture_blob_and_migration(self):
+        import base64
+        import shutil
+        blob_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, blob_dir)
+        auth.db_blob_utils.BLOB_DIR = blob_dir
+        png = b"\x89PNG\r\n\x1a\n" + b"0" * 20
+        auth.add_user("jade", "jade@example.com", "Password123")
+        blob_hash = auth.set_profile_picture("jade", png)
+        user = auth.get_user("jade")
+        self.assertEqual(user["profile_picture_hash"], blob_hash)
+        self.assertEqual(user["profile_picture_mime"], "image/png")
+        with open(auth.db_blob_utils.get_blob_path(blob_hash), "rb") as f:
+            self.assertEqual(f.read(), png)
+        # Ancien format : image en base64 dans la DB
+        auth.add_user("karl", "karl@example.com", "Password123")
+        db = auth._load_db()
+        auth.get_user("karl")["profile_picture"] = base64.b64encode(png).decode()
+        auth._save_db(db)
+        self.assertEqual(auth.migrate_profile_pictures(), 1)
+        self.assertNotIn("profile_picture", auth.get_user("karl"))
+        self.assertEqual(auth.get_user("karl")["profile_picture_hash"], blob_hash)
+
+    def test_corrupt_db_raises(self):
+        auth.add_user("lou", "lou@example.com", "Password123")
+        with open(auth.DB_FILE, "w", encoding="utf-8") as f:
+            f.write('{"users": [{"username": "lou"')  # fichier tronqué
+        with self.assertRaises(auth.CorruptDatabaseError):
+            auth.get_user("lou")
+
+    def test_sqlite_user_store(self):
+        import shutil
+        import db_sqlite_utils
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        old = db_sqlite_utils.SQLITE_FILE, auth.BACKEND
+        db_sqlite_utils.SQLITE_FILE = os.path.join(folder, "test.db")
+        auth.BACKEND = "sqlite"
+        try:
+            auth.add_user("mona", "Mona@example.com", "Password123")
+            auth.add_user("nils", "nils@example.com", "Password123")
+            mona = auth.get_uid("mona")
+            db = auth._load_db()
+            auth.get_user("nils")["following"] = [mona]
+            auth.get_user("mona")["username"] = "mona2"
+            auth._save_db(db)
+            # Nouveau process : tout est relu depuis SQLite
+            auth._STORE = None
+            self.assertIsNone(auth.get_user("mona"))
+            self.assertEqual(auth.get_user_by_email("mona@example.com")["username"], "mona2")
+            self.assertEqual(auth.search_usernames("mo"), ["mona2"])
+            self.assertEqual(auth.get_user("nils")["following"], [mona])
+            self.assertEqual(auth.get_username(mona), "mona2")
+            # Suppression : la ligne du user disparaît aussi de SQLite
+            auth.delete_user("nils").result()
+            rows = auth._store()._conn.execute("SELECT username FROM users").fetchall()
+            self.assertEqual(rows, [("mona2",)])
+        finally:
+            db_sqlite_utils.SQLITE_FILE, auth.BACKEND = old
+            auth._STORE = None
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,228 @@
+import heapq
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+import db_tweet_utils
+from search_utils import fold
+
+
+############## IDÉES AMÉLIORATIONS ##############
+    # Tendances "montantes" : comparer la fenêtre courante à la précédente plutôt que le volume brut
+    # Ignorer les hashtags postés en rafale par un seul compte (spam)
+
+#------------ Variables globales ------------#
+TRENDING_WINDOWS = {"1h": (3600, 60), "24h": (86400, 96)}  #nom -> (durée en secondes, nb de tranches)
+TRENDING_SIZE = 10  #nb de tendances affichées par fenêtre
+TRENDING_CANDIDATES = 100  #nb max de hashtags / mentions suivis par fenêtre pour le top
+CMS_WIDTH = 2048  #colonnes du Count-Min Sketch (précision)
+CMS_DEPTH = 4  #lignes du Count-Min Sketch (probabilité d'erreur)
+
+_COUNTERS = None  # (fenêtre, "hashtags" ou "mentions") -> SlidingTopK, construit au premier affichage
+_LOCK = threading.Lock()  # le listener (écritures) et l'affichage peuvent tourner en même temps
+
+
+#------------ Compteurs ------------#
+class SlidingTopK:
+    """
+    Les éléments les plus fréquents sur une fenêtre glissante (ex : la
+    dernière heure), en mémoire bornée quel que soit le nombre de tweets.
+
+    - La fenêtre est découpée en tranches (ex : 60 tranches d'une minute).
+      Chaque tranche a son Count-Min Sketch (CMS_DEPTH lignes de CMS_WIDTH
+      compteurs, une fonction de hachage par ligne) et on garde leur somme :
+      l'estimation d'un élément est le minimum de ses compteurs dans la
+      somme (jamais en dessous du vrai nombre).
+    - Quand une tranche sort de la fenêtre, on la retire de la somme.
+    - Seuls TRENDING_CANDIDATES éléments sont suivis pour le top : chaque
+      ajout met à jour l'estimation de l'élément et évince le plus faible si
+      besoin. Le top coûte donc le même prix quel que soit le volume.
+    """
+
+    def __init__(self, window, nb_slices):
+        self.window = window
+        self.slice = window // nb_slices
+        self._slices = deque()  # (début de la tranche en secondes, compteurs), de la plus ancienne à la plus récente
+        self._total = [[0] * CMS_WIDTH for _ in range(CMS_DEPTH)]
+        self._candidates = {}  # élément -> dernière estimation
+
+    @staticmethod
+    def _columns(item):
+        """Colonne de l'élément dans chaque ligne du sketch."""
+        return [hash((row, item)) % CMS_WIDTH for row in range(CMS_DEPTH)]
+
+    def _expire(self, now):
+        """Retire de la somme les tranches sorties de la fenêtre."""
+        while self._slices and self._slices[0][0] <= now - self.window:
+            _, counts = self._slices.popleft()
+            for row, total_row in zip(counts, self._total):
+                for col, value in row.items():
+                    total_row[col] -= value
+
+    def _slice_for(self, when, create):
+        """
+        Compteurs de la tranche qui contient when. None si elle est sortie
+        de la fenêtre, ou si elle n'existe pas et que create est faux.
+        """
+        start = when - when % self.slice
+        if self._slices and start <= self._slices[-1][0] - self.window:
+            return None  # trop ancien
+        i = len(self._slices)
+        while i > 0 and self._slices[i - 1][0] >= start:
+            if self._slices[i - 1][0] == start:
+                return self._slices[i - 1][1]
+            i -= 1
+        if not create:
+            return None
+        counts = [{} for _ in range(CMS_DEPTH)]  # creux : seules les colonnes touchées
+        self._slices.insert(i, (start, counts))
+        if i == len(self._slices) - 1:
+            self._expire(when)  # nouvelle tranche la plus récente : la fenêtre avance
+        return counts
+
+    def estimate(self, item):
+        """Nombre estimé d'occurrences de item dans la fenêtre."""
+        return min(self._total[row][col] for row, col in enumerate(self._columns(item)))
+
+    def add(self, item, when, count=1):
+        """
+        Compte item à l'instant when (secondes depuis l'epoch).
+        count = -1 retire une occurrence (tweet supprimé).
+        """
+        counts = self._slice_for(when, create=count > 0)
+        if counts is None:
+            return
+        for row, col in enumerate(self._columns(item)):
+            counts[row][col] = counts[row].get(col, 0) + count
+            self._total[row][col] += count
+        self._candidates[item] = self.estimate(item)
+        if len(self._candidates) > TRENDING_CANDIDATES:
+            weakest = min(self._candidates, key=self._candidates.get)
+            del self._candidates[weakest]
+
+    def top(self, now, k):
+        """
+        Les k éléments les plus fréquents dans la fenêtre qui finit à now.
+
+        Returns
+        -------
+        list of tuple
+            (élément, nombre estimé), du plus fréquent au moins fréquent.
+        """
+        self._expire(now)
+        scored = []
+        for item in list(self._candidates):
+            self._candidates[item] = self.estimate(item)
+            if self._candidates[item] <= 0:
+                del self._candidates[item]
+            else:
+                scored.append((self._candidates[item], item))
+        return [(item, count) for count, item in heapq.nlargest(k, scored)]
+
+
+#------------ Fonctions internes ------------#
+def _timestamp(tweet):
+    """Date du tweet en secondes depuis l'epoch, None si illisible."""
+    try:
+        return int(datetime.fromisoformat(db_tweet_utils._date_key(tweet.get("date"))).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+def _tags(tweet):
+    """
+    Hashtags et mentions d'un tweet, en minuscules et sans accents (#INSA et
+    #insa, @Alice et @alice comptent ensemble). Extraits à l'écriture depuis
+    post_tweet ; les anciens tweets sont extraits ici.
+    """
+    if "hashtags" in tweet:
+        hashtags, mentions = tweet["hashtags"], tweet.get("mentions", [])
+    else:
+        hashtags, mentions = db_tweet_utils.extract_tags(tweet.get("content") or "")
+    return {"hashtags": [fold(h) for h in hashtags], "mentions": [fold(m) for m in mentions]}
+
+def _count(tweet, sign):
+    """Ajoute (sign = 1) ou retire (sign = -1) les tags d'un tweet des compteurs."""
+    when = _timestamp(tweet)
+    if when is None:
+        return
+    for kind, items in _tags(tweet).items():
+        for (_, counter_kind), counter in _COUNTERS.items():
+            if counter_kind == kind:
+                for item in items:
+                    counter.add(item, when, sign)
+
+def _track(kind, tweet, op):
+    """Listener : compte les tags des nouveaux tweets, décompte ceux des tweets supprimés."""
+    global _COUNTERS
+    with _LOCK:
+        if kind == "reset":
+            _COUNTERS = None
+            return
+        if _COUNTERS is None:
+            return  # pas encore construit : il le sera à partir de la DB à jour
+        if kind == "post":
+            _count(tweet, 1)
+        elif kind == "delete":
+            _count(tweet, -1)
+
+db_tweet_utils.add_listener(_track)
+
+def _build():
+    """
+    Met la DB des tweets à jour (le listener suit) et, au premier appel,
+    remplit les compteurs avec les tweets de la plus longue fenêtre
+    (parcourus du plus récent au plus ancien, via l'index par date).
+    """
+    global _COUNTERS
+    db_tweet_utils._store().data()  # hors du verrou : peut recharger la DB et appeler _track
+    if _COUNTERS is not None:
+        return
+    # Personne (thread ou worker) n'écrit pendant qu'on remplit les compteurs :
+    # aucun post ne peut passer entre la lecture et le listener
+    with db_tweet_utils.tweets_transaction():
+        oldest = (datetime.now() - timedelta(seconds=max(w for w, _ in TRENDING_WINDOWS.values()))).isoformat()
+        recent = []
+        cursor = None
+        while True:
+            page, cursor = db_tweet_utils.get_timeline_page(cursor, 200)
+            recent.extend(t for t in page if db_tweet_utils._date_key(t.get("date")) >= oldest)
+            if cursor is None or (page and db_tweet_utils._date_key(page[-1].get("date")) < oldest):
+                break
+        with _LOCK:
+            if _COUNTERS is not None:
+                return
+            _COUNTERS = {(name, kind): SlidingTopK(window, nb_slices)
+                         for name, (window, nb_slices) in TRENDING_WINDOWS.items()
+                         for kind in ("hashtags", "mentions")}
+            for t in reversed(recent):  # du plus ancien au plus récent, comme en direct
+                _count(t, 1)
+
+
+#------------ Fonctions publiques ------------#
+def get_trending(k=TRENDING_SIZE):
+    """
+    Hashtags et mentions les plus utilisés sur chaque fenêtre (dernière
+    heure, dernières 24 h). Ne relit pas les tweets : les compteurs sont
+    tenus à jour à chaque post.
+
+    Parameters
+    ----------
+    k : int
+        Nombre de tendances par fenêtre et par type.
+
+    Returns
+    -------
+    dict
+        {"1h": {"hashtags": [("insa", 12), ...], "mentions": [("astrid", 3), ...]},
+         "24h": {...}}. Les nombres sont des estimations (jamais en dessous
+        du vrai nombre).
+    """
+    while True:
+        _build()
+        with _LOCK:
+            if _COUNTERS is None:
+                continue  # DB rechargée entre temps : on reconstruit
+            now = int(datetime.now().timestamp())
+            trending = {name: {} for name in TRENDING_WINDOWS}
+            for (name, kind), counter in _COUNTERS.items():
+                trending[name][kind] = counter.top(now, k)
+            return trending
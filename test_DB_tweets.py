@@ -1,8 +1,9 @@
 import unittest
 import tempfile
 import os
+import json
+import db_auth_utils as auth_utils  # avant db_tweet_utils (import circulaire)
 import db_tweet_utils as tweets
-import data_base.db_auth_utils as auth_utils
 
 class TestDBTweetsUtils(unittest.TestCase):
 
@@ -24,12 +25,15 @@ class TestDBTweetsUtils(unittest.TestCase):
     def tearDown(self):
         if os.path.exists(self.tmp_db.name):
             os.remove(self.tmp_db.name)
+        for path in (self.tmp_db.name + ".log", self.tmp_db.name + ".lock", self.tmp_auth_db.name + ".lock"):
+            if os.path.exists(path):
+                os.remove(path)
         if os.path.exists(self.tmp_auth_db.name):
             os.remove(self.tmp_auth_db.name)
 
-    def _create_user(self, username):
-        # Crée un user dans la DB auth temporaire
-        db = {"users": [{"username": username, "tweets_posted": []}]}
+    def _create_user(self, username, *others):
+        # Crée un ou plusieurs users dans la DB auth temporaire
+        db = {"users": [{"username": name, "tweets_posted": []} for name in (username,) + others]}
         with open(auth_utils.DB_FILE, "w", encoding="utf-8") as f:
             import json
             json.dump(db, f)
@@ -63,6 +67,60 @@ class TestDBTweetsUtils(unittest.TestCase):
         rand_id = tweets.select_random_tweet()
         self.assertIn(rand_id, ids)
 
+    def test_sample_tweets(self):
+        self._create_user("carol")
+        with open(tweets.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"tweets": [{"tweet_id": "old", "username": "carol",
+                                   "date": "07/10/2020 05:20", "content": "Vieux"}]}, f)
+        tweets._store().invalidate()
+        ids = [tweets.post_tweet("carol", f"Tweet {i}")["tweet_id"] for i in range(5)]
+        tweets.delete_tweet(ids.pop(0))  # retrait par échange avec le dernier id
+        tweets.add_report(ids[0], "carol")
+        store = tweets._store()
+        self.assertEqual([t["tweet_id"] for t in store.data()["tweets"]], store._ids)
+        store.compact()
+        store.invalidate()
+        self.assertEqual(sorted(t["tweet_id"] for t in store.data()["tweets"]), sorted(ids + ["old"]))
+
+        sample = tweets.sample_tweets(10)
+        self.assertEqual(sorted(t["tweet_id"] for t in sample), sorted(ids + ["old"]))
+        self.assertEqual(sample[0]["username"], "carol")
+        recent = tweets.sample_tweets(10, max_age=3600, exclude_reported=True)
+        self.assertEqual(sorted(t["tweet_id"] for t in recent), sorted(ids[1:]))
+        self.assertEqual(len(tweets.sample_tweets(2)), 2)
+        self.assertIn(tweets.select_random_tweet(max_age=3600, exclude_reported=True), ids[1:])
+
+    def test_replies_pages(self):
+        self._create_user("rose")
+        with open(tweets.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"tweets": [{"tweet_id": "old", "username": "rose", "date": "07/10/2020 05:20",
+                                   "content": "Vieux", "replies": [
+                                       {"reply_id": "r2", "username": "rose", "date": "07/10/2020 05:22", "content": "Deux"},
+                                       {"reply_id": "r1", "username": "rose", "date": "07/10/2020 05:21", "content": "Un"}]}]}, f)
+        tweets._store().invalidate()
+        for i in range(3):
+            tweets.add_reply("old", "rose", f"Réponse {i}")
+
+        # Anciennes réponses sorties du tweet, triées par date
+        self.assertNotIn("replies", tweets._store().get("old"))
+        view = tweets.timeline_view([tweets._store().get("old")], "rose")[0]
+        self.assertEqual((view["reply_count"], [r["content"] for r in view["replies"]]), (5, ["Un", "Deux"]))
+        # Même seconde : le numéro d'ordre garde l'ordre d'arrivée
+        page1, cursor = tweets.get_replies("old", view["replies_cursor"], limit=2)
+        page2, cursor = tweets.get_replies("old", cursor, limit=2)
+        self.assertEqual((len(page1), len(page2), cursor), (2, 1, None))
+        self.assertEqual([r["content"] for r in page1 + page2], [f"Réponse {i}" for i in range(3)])
+
+        # Rangées à part dans le snapshot après compaction
+        tweets._store().compact()
+        tweets._store().invalidate()
+        self.assertEqual([r["content"] for r in tweets.get_tweet("old")["replies"]],
+                         ["Un", "Deux"] + [f"Réponse {i}" for i in range(3)])
+        tweets.delete_tweet("old")
+        self.assertEqual(tweets.get_user_activity(auth_utils.get_uid("rose"))["replies"], set())
+        with self.assertRaises(tweets.TweetNotFound):
+            tweets.get_replies("old")
+
     def test_get_tweet_not_found(self):
         with self.assertRaises(tweets.TweetNotFound):
             tweets.get_tweet("nonexistent")
@@ -71,5 +129,519 @@ class TestDBTweetsUtils(unittest.TestCase):
         with self.assertRaises(tweets.TweetNotFound):
             tweets.delete_tweet("nonexistent")
 
+    def test_store_reload_after_external_change(self):
+        self._create_user("dan")
+        t_id = tweets.post_tweet("dan", "En cache")["tweet_id"]
+        self.assertEqual(tweets.get_tweet(t_id)["content"], "En cache")
+        # Modification du fichier par un autre process
+        import json
+        with open(tweets.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"tweets": [{"tweet_id": t_id, "username": "dan",
+                                   "date": "2025-01-01T00:00:00",
+                                   "content": "Modifié dehors"}]}, f)
+        self.assertEqual(tweets.get_tweet(t_id)["content"], "Modifié dehors")
+
+    def test_index_follows_post_and_delete(self):
+        self._create_user("erin")
+        ids = [tweets.post_tweet("erin", f"Tweet {i}")["tweet_id"] for i in range(3)]
+        tweets.delete_tweet(ids[1])
+        self.assertEqual(tweets.get_tweet(ids[0])["content"], "Tweet 0")
+        self.assertEqual(tweets.get_tweet(ids[2])["content"], "Tweet 2")
+        with self.assertRaises(tweets.TweetNotFound):
+            tweets.get_tweet(ids[1])
+
+    def test_log_replayed_on_load(self):
+        self._create_user("fred", "gina")
+        t_id = tweets.post_tweet("fred", "Journal")["tweet_id"]
+        tweets.like_tweet(t_id, "gina")
+        tweets.toggle_retweet(t_id, "gina")
+        tweets.add_reply(t_id, "gina", "Réponse")
+        # Les écritures vont dans le journal, pas dans le snapshot
+        self.assertTrue(os.path.exists(tweets.DB_FILE + ".log"))
+        # Nouveau process : on relit snapshot + journal
+        tweets._store().invalidate()
+        t = tweets.get_tweet(t_id)
+        self.assertEqual(t["likes"], {"gina"})
+        self.assertEqual(t["retweet_count"], 1)
+        self.assertEqual(t["replies"][0]["content"], "Réponse")
+
+    def test_reply_to_deleted_tweet(self):
+        from unittest import mock
+        self._create_user("fred", "gina")
+        t_id = tweets.post_tweet("fred", "Bientôt supprimé")["tweet_id"]
+        get_uid = auth_utils.get_uid
+
+        def delete_then_get_uid(username):
+            tweets.delete_tweet(t_id)  # supprimé juste avant que la réponse soit écrite
+            return get_uid(username)
+
+        with mock.patch.object(auth_utils, "get_uid", side_effect=delete_then_get_uid):
+            with self.assertRaises(tweets.TweetNotFound):
+                tweets.add_reply(t_id, "gina", "Trop tard")
+        self.assertEqual(tweets._store().replies(t_id)[0], [])
+
+    def test_log_compaction(self):
+        self._create_user("hugo", "ines")
+        old_limit = tweets.LOG_COMPACT_EVERY
+        tweets.LOG_COMPACT_EVERY = 3
+        try:
+            t_id = tweets.post_tweet("hugo", "Compaction")["tweet_id"]
+            tweets.like_tweet(t_id, "ines")
+            tweets.like_tweet(t_id, "ines")  # 3e opération -> compaction
+        finally:
+            tweets.LOG_COMPACT_EVERY = old_limit
+        self.assertFalse(os.path.exists(tweets.DB_FILE + ".log"))
+        tweets._store().invalidate()
+        self.assertEqual(tweets.get_likes_count(t_id), 0)
+
+    def test_compaction_by_other_store(self):
+        from unittest import mock
+        a, b = tweets.TweetStore(tweets.DB_FILE), tweets.TweetStore(tweets.DB_FILE)
+        new = lambda i: {"tweet_id": f"t{i}", "uid": "x", "date": "2025-01-01T00:00:00", "content": str(i)}
+        for i in range(3):
+            a.add(new(i))
+        b.data()
+        # a relit entre l'écriture du snapshot par b et la suppression du journal
+        remove = os.remove
+        def remove_after_read(path):
+            a.data()
+            remove(path)
+        with mock.patch.object(tweets.os, "remove", remove_after_read):
+            b.compact()
+        a.data()  # journal absent
+        for i in range(3, 10):
+            b.add(new(i))  # nouveau journal, plus long que l'ancien
+        self.assertEqual(len(a.data()["tweets"]), 10)
+        self.assertEqual(len(b.data()["tweets"]), 10)
+
+    def test_timeline_view(self):
+        self._create_user("jade", "kim", "lou")
+        t = tweets.post_tweet("jade", "Vue timeline")
+        tweets.like_tweet(t["tweet_id"], "kim")
+        tweets.toggle_retweet(t["tweet_id"], "lou")
+        view = tweets.timeline_view([tweets.get_tweet(t["tweet_id"])], "kim")[0]
+        self.assertTrue(view["liked"])
+        # Nom inconnu (session périmée) : refusé à l'écriture, "n'a rien fait" à l'affichage
+        for write in (tweets.like_tweet, tweets.toggle_retweet, tweets.add_report):
+            with self.assertRaises(auth_utils.UserNotFoundError):
+                write(t["tweet_id"], "inconnu")
+        with self.assertRaises(auth_utils.UserNotFoundError):
+            tweets.add_reply(t["tweet_id"], "inconnu", "Réponse")
+        self.assertFalse(tweets.timeline_view([tweets.get_tweet(t["tweet_id"])], "inconnu")[0]["liked"])
+        self.assertFalse(view["retweeted"])
+        self.assertEqual(view["likes_count"], 1)
+        self.assertEqual(view["retweet_count"], 1)
+        self.assertNotIn("T", view["date"])
+        # Le cache n'est pas modifié
+        self.assertIn("T", tweets.get_tweet(t["tweet_id"])["date"])
+
+    def test_timeline_pages(self):
+        self._create_user("leo")
+        ids = [tweets.post_tweet("leo", f"Tweet {i}")["tweet_id"] for i in range(5)]
+        # Même seconde possible : l'ordre dépend alors du tweet_id, on compare juste les ensembles
+        page1, cursor = tweets.get_timeline_page(limit=3)
+        self.assertEqual(len(page1), 3)
+        self.assertIsNotNone(cursor)
+        page2, cursor2 = tweets.get_timeline_page(cursor, limit=3)
+        self.assertEqual(len(page2), 2)
+        self.assertIsNone(cursor2)
+        self.assertEqual({t["tweet_id"] for t in page1 + page2}, set(ids))
+
+    def test_timeline_mixed_date_formats(self):
+        db = {"tweets": [
+            {"tweet_id": "a", "username": "x", "date": "07/10/2025 05:20", "content": "ancien"},
+            {"tweet_id": "b", "username": "x", "date": "2025-10-14T11:22:59", "content": "récent"},
+            {"tweet_id": "c", "username": "x", "date": "2025-10-01T08:00:00", "content": "plus ancien"},
+        ]}
+        tweets._save_tweets(db)
+        page, _ = tweets.get_timeline_page(limit=10)
+        self.assertEqual([t["tweet_id"] for t in page], ["b", "a", "c"])
+
+    def test_home_timeline(self):
+        import json
+        db = {"users": [
+            {"username": "mia", "tweets": [], "followers": [], "following": ["noe"]},
+            {"username": "noe", "tweets": [], "followers": ["mia"], "following": []},
+            {"username": "oscar", "tweets": [], "followers": [], "following": []},
+        ]}
+        with open(auth_utils.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump(db, f)
+        t1 = tweets.post_tweet("noe", "Suivi")["tweet_id"]
+        tweets.post_tweet("oscar", "Pas suivi")
+        page, _ = tweets.get_home_timeline("mia")
+        self.assertEqual([t["tweet_id"] for t in page], [t1])
+        # Fan-out à l'écriture dans la boîte déjà construite
+        t2 = tweets.post_tweet("noe", "Nouveau")["tweet_id"]
+        page, _ = tweets.get_home_timeline("mia")
+        self.assertEqual({t["tweet_id"] for t in page}, {t1, t2})
+        # Pages : le curseur reprend juste après le dernier tweet lu
+        page1, cursor = tweets.get_home_timeline("mia", limit=1)
+        page2, cursor = tweets.get_home_timeline("mia", cursor, limit=1)
+        self.assertEqual(({t["tweet_id"] for t in page1 + page2}, cursor), ({t1, t2}, None))
+        # Follow fait par un autre worker (fichier des users réécrit) : boîte reconstruite
+        db["users"][0]["following"].append("oscar")
+        db["users"][2]["followers"].append("mia")
+        with open(auth_utils.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump(db, f)
+        page, _ = tweets.get_home_timeline("mia")
+        self.assertEqual(len(page), 3)
+        # Comptes très suivis : lus à la demande, fusionnés page par page
+        old = tweets.FANOUT_MAX_FOLLOWERS
+        tweets.FANOUT_MAX_FOLLOWERS = 0
+        try:
+            tweets.invalidate_home_timeline("mia")
+            page1, cursor = tweets.get_home_timeline("mia", limit=2)
+            page2, cursor2 = tweets.get_home_timeline("mia", cursor, limit=2)
+        finally:
+            tweets.FANOUT_MAX_FOLLOWERS = old
+        self.assertEqual((len(page1), len(page2), cursor2), (2, 1, None))
+        self.assertEqual(len({t["tweet_id"] for t in page1 + page2}), 3)
+
+    def test_rename_keeps_tweets(self):
+        auth_utils.add_user("rita", "rita@example.com", "Password123")
+        auth_utils.add_user("sam", "sam@example.com", "Password123")
+        t_id = tweets.post_tweet("rita", "Coucou")["tweet_id"]
+        tweets.like_tweet(t_id, "sam")
+        tweets.add_reply(t_id, "sam", "Salut")
+        # Renommage : seul le user change
+        db = auth_utils._load_db()
+        auth_utils.get_user("sam")["username"] = "samuel"
+        auth_utils._save_db(db)
+        tweets._STORE = None
+        fetched = tweets.get_tweet(t_id)
+        self.assertEqual(fetched["username"], "rita")
+        self.assertEqual(fetched["replies"][0]["username"], "samuel")
+        self.assertTrue(tweets.has_user_liked(t_id, "samuel"))
+        view = tweets.timeline_view([tweets._store().get(t_id)], "samuel")[0]
+        self.assertTrue(view["liked"])
+        self.assertEqual(view["replies"][0]["username"], "samuel")
+        # Compte supprimé : plus de nom à afficher
+        auth_utils.delete_user("rita")
+        self.assertEqual(tweets.get_tweet(t_id)["username"], auth_utils.DELETED_USERNAME)
+
+    def test_delete_account_cleans_up(self):
+        auth_utils.add_user("tom", "tom@example.com", "Password123")
+        auth_utils.add_user("ugo", "ugo@example.com", "Password123")
+        tom, ugo = auth_utils.get_uid("tom"), auth_utils.get_uid("ugo")
+        db = auth_utils._load_db()
+        auth_utils.get_user("tom")["following"] = [ugo]
+        auth_utils.get_user("ugo")["followers"] = [tom]
+        auth_utils._save_db(db)
+        t_ugo = tweets.post_tweet("ugo", "Mon tweet")["tweet_id"]
+        t_tom = tweets.post_tweet("tom", "À garder")["tweet_id"]
+        tweets.like_tweet(t_ugo, "tom")
+        tweets.toggle_retweet(t_ugo, "tom")
+        tweets.add_reply(t_ugo, "tom", "Bravo")
+        self.assertEqual(tweets.get_user_activity(tom)["likes"], {t_ugo})
+        auth_utils.delete_user("tom").result()
+        t = tweets.get_tweet(t_ugo)
+        self.assertEqual((t["likes"], t["retweets"], t["replies"]), (set(), set(), []))
+        self.assertEqual(auth_utils.get_user("ugo")["followers"], [])
+        self.assertEqual(tweets.get_tweet(t_tom)["username"], auth_utils.DELETED_USERNAME)
+        self.assertEqual(tweets.get_user_activity(tom)["likes"], set())
+
+    def test_user_tweets_pages(self):
+        self._create_user("vera")
+        ids = [f"v{i}" for i in range(5)]  # dates distinctes : deux posts dans la même seconde n'ont pas d'ordre garanti
+        with open(tweets.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"tweets": [{"tweet_id": tweet_id, "uid": "vera", "date": f"2025-10-07T05:2{i}:00",
+                                   "content": f"Tweet {i}"} for i, tweet_id in enumerate(ids)]}, f)
+        tweets._store().invalidate()
+        self.assertEqual([t["tweet_id"] for t in tweets.get_tweets([ids[1], "inconnu", ids[0]])], [ids[1], ids[0]])
+        page, cursor = auth_utils.get_user_tweets_page("vera", limit=2)
+        self.assertEqual([t["tweet_id"] for t in page], [ids[4], ids[3]])
+        tweets.delete_tweet(ids[0])  # la liste du user bouge entre deux pages
+        page, cursor = auth_utils.get_user_tweets_page("vera", cursor, limit=2)
+        self.assertEqual([t["tweet_id"] for t in page], [ids[2], ids[1]])
+        self.assertIsNone(cursor)
+        self.assertEqual(len(auth_utils.get_user_tweets("vera")), 4)
+
+    def test_search_tweets(self):
+        search_utils = __import__("search_utils")
+        self._create_user("wan")
+        t1 = tweets.post_tweet("wan", "Rentrée à l'École ce matin")["tweet_id"]
+        t2 = tweets.post_tweet("wan", "école école école")["tweet_id"]
+        tweets.post_tweet("wan", "Rien à voir")
+        found, cursor = search_utils.search_tweets("ECOLE", limit=1)
+        self.assertEqual([t["tweet_id"] for t in found], [t2])  # le plus pertinent d'abord
+        found, cursor = search_utils.search_tweets("ecole", cursor, limit=1)
+        self.assertEqual(([t["tweet_id"] for t in found], cursor), ([t1], None))
+        # Index tenu à jour : réponses et suppressions
+        tweets.add_reply(t1, "wan", "Bon courage pour les partiels")
+        self.assertEqual([t["tweet_id"] for t in search_utils.search_tweets("partiels école")[0]], [t1])
+        self.assertEqual(search_utils._DOC_TOKENS[t1], search_utils._document(tweets._store().get(t1)))
+        tweets.delete_tweet(t2)
+        self.assertEqual([t["tweet_id"] for t in search_utils.search_tweets("école")[0]], [t1])
+        self.assertEqual(search_utils.search_tweets("le la")[0], [])
+
+    def test_search_ligatures(self):
+        search_utils = __import__("search_utils")
+        self.assertEqual(search_utils.tokenize("Ma sœur a le cœur … une ŒUVRE, Lætitia"),
+                         ["soeur", "coeur", "oeuvre", "laetitia"])
+        self._create_user("yves")
+        t1 = tweets.post_tweet("yves", "Ma sœur est là")["tweet_id"]
+        t2 = tweets.post_tweet("yves", "J'ai le cœur léger")["tweet_id"]
+        self.assertEqual([t["tweet_id"] for t in search_utils.search_tweets("cœur")[0]], [t2])
+        self.assertEqual([t["tweet_id"] for t in search_utils.search_tweets("soeur")[0]], [t1])
+
+    def test_trending(self):
+        trending_utils = __import__("trending_utils")
+        self._create_user("xia")
+        t_id = tweets.post_tweet("xia", "#INSA #Été @xia")["tweet_id"]
+        tweets.post_tweet("xia", "#insa encore @XIA")
+        self.assertEqual(tweets.get_tweet(t_id)["hashtags"], ["insa", "été"])
+        trending = trending_utils.get_trending()
+        self.assertEqual(trending["1h"]["hashtags"], [("insa", 2), ("ete", 1)])
+        self.assertEqual(trending["24h"]["mentions"], [("xia", 2)])
+        tweets.delete_tweet(t_id)
+        self.assertEqual(trending_utils.get_trending()["1h"]["hashtags"], [("insa", 1)])
+        self.assertEqual(trending_utils.get_trending()["1h"]["mentions"], [("xia", 1)])
+        # Fenêtre glissante : les tranches trop anciennes sortent du compte
+        counter = trending_utils.SlidingTopK(3600, 60)
+        counter.add("vieux", 1000)
+        counter.add("neuf", 1000 + 3600)
+        self.assertEqual(counter.top(1000 + 3600, 5), [("neuf", 1)])
+
+    def test_moderation_queue(self):
+        moderation_utils = __import__("moderation_utils")
+        tweets._save_tweets({"tweets": [{"tweet_id": "ancien", "username": "yan", "date": "2025-10-14T11:22:59",
+                                         "content": "signalé avant", "reporters": ["a", "b"], "reports": 5}]})
+        tweets._store().invalidate()
+        self._create_user("yan", "a", "b")
+        t1 = tweets.post_tweet("yan", "Un")["tweet_id"]
+        t2 = tweets.post_tweet("yan", "Deux")["tweet_id"]
+        tweets.add_report(t1, "a")
+        tweets.add_report(t2, "a")
+        self.assertEqual([t["tweet_id"] for t in moderation_utils.get_moderation_queue()], ["ancien"] + sorted([t1, t2]))
+        # Même nombre de signalements : le plus rapide passe devant l'ancien (sans dates)
+        self.assertEqual(tweets.add_report(t2, "b"), 2)
+        queue = moderation_utils.get_moderation_queue()
+        self.assertEqual([t["tweet_id"] for t in queue], [t2, "ancien", t1])
+        self.assertEqual((queue[0]["reports"], queue[1]["reports"]), (2, 2))
+        self.assertIsInstance(tweets._store().get(t2)["reporters"], set)
+        with self.assertRaises(tweets.AlreadyReported):
+            tweets.add_report(t2, "b")
+        tweets.delete_tweet(t2)
+        self.assertEqual([t["tweet_id"] for t in moderation_utils.get_moderation_queue(1)], ["ancien"])
+
+    def test_likes_retweets_sets(self):
+        import json
+        db = {"tweets": [{"tweet_id": "v", "username": "x", "date": "2025-10-14T11:22:59", "content": "viral",
+                          "likes": ["a", "b"], "retweets": ["a"], "retweet_count": 7}]}
+        tweets._save_tweets(db)
+        tweets._store().invalidate()
+        self._create_user("a", "b", "c")
+        # Compteur désynchronisé dans le fichier : recalculé au chargement
+        self.assertEqual(tweets.get_retweet_count("v"), 1)
+        self.assertEqual(tweets.toggle_retweet("v", "b"), (True, 2))
+        self.assertEqual(tweets.toggle_retweet("v", "b"), (False, 1))
+        tweets.like_tweet("v", "c")
+        tweets.like_tweet("v", "a")  # annule
+        self.assertIsInstance(tweets.get_tweet("v")["likes"], set)
+        self.assertEqual(tweets.get_likes_count("v"), 2)
+        # Écrits en listes dans le fichier
+        tweets._store().compact()
+        with open(tweets.DB_FILE, encoding="utf-8") as f:
+            saved = json.load(f)["tweets"][0]
+        self.assertEqual(saved["likes"], ["b", "c"])
+        self.assertEqual(saved["retweet_count"], 1)
+
+    def test_corrupt_snapshot_not_treated_as_empty(self):
+        with open(tweets.DB_FILE, "w", encoding="utf-8") as f:
+            f.write('{"tweets": [{"tweet_id": "a", "con')  # écriture interrompue
+        tweets._store().invalidate()
+        with self.assertRaises(tweets.CorruptDatabaseError):
+            tweets._load_tweets()
+
+    def test_transaction_sees_other_writers(self):
+        self._create_user("paul")
+        t_id = tweets.post_tweet("paul", "Transaction")["tweet_id"]
+        # Un autre worker like pendant qu'on a le cache en mémoire
+        other = tweets.TweetStore(tweets.DB_FILE)
+        other.apply({"op": "like", "tweet_id": t_id, "username": "quentin"})
+        with tweets.tweets_transaction():
+            self.assertIn("quentin", tweets._store().get(t_id)["likes"])
+        # Snapshot réécrit sans fichier temporaire qui traîne
+        tweets._store().compact()
+        folder = os.path.dirname(tweets.DB_FILE)
+        self.assertFalse([f for f in os.listdir(folder) if f.startswith(os.path.basename(tweets.DB_FILE)) and f.endswith(".tmp")])
+
+    def test_group_commit(self):
+        def log_lines():
+            if not os.path.exists(tweets.DB_FILE + ".log"):
+                return 0
+            with open(tweets.DB_FILE + ".log", encoding="utf-8") as f:
+                return len(f.readlines())
+        old = tweets.FLUSH_INTERVAL_MS, tweets.FLUSH_MAX_OPS
+        tweets.FLUSH_INTERVAL_MS, tweets.FLUSH_MAX_OPS = 60000, 3
+        try:
+            self._create_user("rose", "sam")
+            t_id = tweets.post_tweet("rose", "Groupé")["tweet_id"]
+            tweets.set_media_variants(t_id, {"thumb": {"path": "t.jpg"}})
+            # Appliqué en mémoire, pas encore sur le disque
+            self.assertIn("media_variants", tweets.get_tweet(t_id))
+            self.assertEqual(log_lines(), 0)
+            t2 = tweets.post_tweet("rose", "Encore")["tweet_id"]  # 3e opération -> écriture groupée
+            self.assertEqual(log_lines(), 3)
+            # Un toggle est décidé d'après l'état lu : écrit tout de suite
+            tweets.like_tweet(t_id, "sam")
+            self.assertEqual(log_lines(), 4)
+            tweets.delete_tweet(t2)
+            self.assertEqual(log_lines(), 4)
+            tweets.flush_tweets()  # comme à l'arrêt du process
+            self.assertEqual(log_lines(), 5)
+        finally:
+            tweets.FLUSH_INTERVAL_MS, tweets.FLUSH_MAX_OPS = old
+        tweets._store().invalidate()
+        self.assertEqual(tweets.get_likes_count(t_id), 1)
+        self.assertIsNone(tweets._store().get(t2))
+
+    def test_sqlite_backend(self):
+        import shutil
+        sqlite_utils = __import__("db_sqlite_utils")
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self._create_user("uma", "val")
+        t_id = tweets.post_tweet("uma", "Migré")["tweet_id"]
+        tweets.like_tweet(t_id, "val")  # dans le journal, pas encore dans le snapshot
+        sqlite_file = os.path.join(folder, "test.db")
+        self.assertEqual(sqlite_utils.migrate_from_json(tweets.DB_FILE, auth_utils.DB_FILE, sqlite_file), (1, 2))
+
+        old = sqlite_utils.SQLITE_FILE, tweets.BACKEND, auth_utils.BACKEND
+        sqlite_utils.SQLITE_FILE = sqlite_file
+        tweets.BACKEND = auth_utils.BACKEND = "sqlite"
+        try:
+            self.assertEqual(tweets.get_tweet(t_id)["likes"], {"val"})
+            t2 = tweets.post_tweet("uma", "Dans SQLite")["tweet_id"]
+            tweets.toggle_retweet(t2, "val")
+            tweets.add_reply(t2, "val", "Réponse")
+            # Un autre worker voit les modifications
+            other = sqlite_utils.SQLiteTweetStore(sqlite_file)
+            self.assertEqual(other.get(t2)["retweet_count"], 1)
+            self.assertEqual(other.replies(t2)[0][0]["content"], "Réponse")
+            other.apply({"op": "like", "tweet_id": t2, "username": "wes"})
+            self.assertEqual(tweets.get_likes_count(t2), 1)
+            tweets.delete_tweet(t_id)
+            self.assertIsNone(other.get(t_id))
+            self.assertEqual([t["tweet_id"] for t in auth_utils.get_user_tweets("uma")], [t2])
+            page, _ = tweets.get_timeline_page(limit=10)
+            self.assertEqual([t["tweet_id"] for t in page], [t2])
+        finally:
+            sqlite_utils.SQLITE_FILE, tweets.BACKEND, auth_utils.BACKEND = old
+            tweets._STORE = None
+            auth_utils._STORE = None
+
+    def test_media_variants(self):
+        import tempfile
+        media_utils = __import__("media_utils")
+        if media_utils.Image is None:
+            self.skipTest("Pillow non installé")
+        with tempfile.TemporaryDirectory() as static:
+            old_static = media_utils.STATIC_FOLDER
+            media_utils.STATIC_FOLDER = static
+            try:
+                os.makedirs(os.path.join(static, "uploads"))
+                media_utils.Image.new("RGB", (2000, 1000)).save(os.path.join(static, "uploads", "big.jpg"))
+                tweet = {"tweet_id": "img", "username": "x", "date": "2025-10-14T11:22:59",
+                         "content": "photo", "media_path": "uploads/big.jpg"}
+                tweets._store().add(tweet)
+                media_utils.submit_media(tweet["tweet_id"], "uploads/big.jpg").result()
+            finally:
+                media_utils.STATIC_FOLDER = old_static
+            variants = tweets.get_tweet(tweet["tweet_id"])["media_variants"]
+            self.assertEqual(variants["thumb"]["width"], 320)
+            self.assertEqual(variants["web"]["width"], 1080)
+            self.assertEqual(variants["original"]["width"], 2000)
+            self.assertTrue(os.path.exists(os.path.join(static, *variants["thumb"]["path"].split("/"))))
+        # Les versions survivent au rechargement depuis le disque
+        tweets._STORE = None
+        self.assertIn("thumb", tweets.get_tweet(tweet["tweet_id"])["media_variants"])
+
+    def test_app_user_cache(self):
+        from unittest import mock
+        appmod = __import__("app")
+        appmod.app.config["TESTING"] = True
+        self._create_user("zoe")
+        client = appmod.app.test_client()
+        with client.session_transaction() as sess:
+            sess["username"] = "zoe"
+        with mock.patch.object(appmod, "get_user", wraps=appmod.get_user) as get_user:
+            # Route, context processor et template : un seul accès à la DB par requête
+            self.assertEqual(client.get("/profile").status_code, 200)
+            self.assertEqual(get_user.call_count, 1)
+            self.assertEqual(client.get("/profile").status_code, 200)
+            self.assertEqual(get_user.call_count, 2)  # rien ne reste d'une requête à l'autre
+
+            with appmod.app.test_request_context():
+                user = appmod.cached_user("zoe")
+                self.assertIs(appmod.cached_user("zoe"), user)
+                self.assertEqual(get_user.call_count, 3)
+                # Renommage pendant la requête : l'ancien nom est oublié
+                with auth_utils.users_transaction() as db:
+                    user["username"] = "zed"
+                    auth_utils._save_db(db)
+                appmod.forget_cached_user("zoe")
+                self.assertIsNone(appmod.cached_user("zoe"))
+                self.assertEqual(appmod.cached_user("zed")["uid"], "zoe")
+                self.assertEqual(get_user.call_count, 5)
+
+        tweet_id = tweets.post_tweet("zed", "Salut")["tweet_id"]
+        with mock.patch.object(appmod, "get_tweet", wraps=appmod.get_tweet) as get_tweet:
+            with appmod.app.test_request_context():
+                self.assertIs(appmod.cached_tweet(tweet_id), appmod.cached_tweet(tweet_id))
+                self.assertEqual(get_tweet.call_count, 1)
+                appmod.forget_cached_tweet(tweet_id)  # après une écriture : relu
+                appmod.cached_tweet(tweet_id)
+                self.assertEqual(get_tweet.call_count, 2)
+
+    def test_app_pfp_cache(self):
+        from unittest import mock
+        appmod = __import__("app")
+        blob_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(blob_dir.cleanup)
+        self._create_user("yan")
+        with mock.patch.object(appmod.db_blob_utils, "BLOB_DIR", blob_dir.name):
+            auth_utils.set_profile_picture("yan", b"\x89PNG\r\n\x1a\n image")
+            client = appmod.app.test_client()
+            with appmod.app.test_request_context():
+                url = appmod.pfp_url("yan")
+            # Version exacte donnée par pfp_url : cache d'un an
+            self.assertIn("immutable", client.get(url).headers["Cache-Control"])
+            # Préfixe du hash, version vide ou absente : on revalide
+            for query in ("?v=" + url.split("v=")[1][:1], "?v=", ""):
+                self.assertEqual(client.get("/pfp/yan" + query).headers["Cache-Control"], "no-cache")
+
+    def test_api_stream(self):
+        try:
+            from fastapi.testclient import TestClient
+        except (ImportError, RuntimeError):  # fastapi ou httpx non installé
+            self.skipTest("fastapi non installé")
+        api = __import__("api")
+        self._create_user("ana")
+        ids = [f"a{i}" for i in range(5)]
+        with open(tweets.DB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"tweets": [{"tweet_id": tweet_id, "uid": "ana", "date": f"2025-10-07T05:2{i}:00",
+                                   "content": f"Tweet {i}"} for i, tweet_id in enumerate(ids)]}, f)
+        tweets._store().invalidate()
+        old_chunk = api.STREAM_CHUNK
+        api.STREAM_CHUNK = 2  # plusieurs lectures par réponse
+        self.addCleanup(setattr, api, "STREAM_CHUNK", old_chunk)
+        client = TestClient(api.api)
+
+        def read(url):
+            r = client.get(url)
+            self.assertEqual((r.status_code, r.headers["content-type"]), (200, api.NDJSON))
+            lines = [json.loads(line) for line in r.text.splitlines()]
+            return [t["tweet_id"] for t in lines[:-1]], lines[-1]["next_cursor"]
+
+        for url in ("/api/timeline", "/api/users/ana/tweets"):
+            page, cursor = read(f"{url}?limit=3")
+            self.assertEqual(page, ["a4", "a3", "a2"])
+            self.assertIsNotNone(cursor)
+            page, cursor = read(f"{url}?limit=10&before={cursor}")
+            self.assertEqual((page, cursor), (["a1", "a0"], None))
+        self.assertEqual(client.get("/api/users/inconnu/tweets").status_code, 404)
+        self.assertEqual(client.get("/api/timeline?limit=0").status_code, 422)
+
 if __name__ == "__main__":
     unittest.main()